@@ -0,0 +1,181 @@
+import argparse
+import collections
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import time
+
+import diagram1
+import diagram2
+
+
+# Each description is a dict such as
+#   {"name": "box", "width": 30, "height": 7,
+#    "rectangles": [[4, 1, 22, 5, "yellow"]],
+#    "texts": [[7, 3, "Abstract Factory"]]}
+# where the rectangles and texts hold the arguments of make_rectangle()
+# and make_text(); every description is rendered once per factory, to
+# box.txt, box.svg, etc., or to box.CompactDiagramFactory.txt, etc., for
+# factories that share an extension. Descriptions whose names hold a path
+# separator or ".." are skipped, and a description that cannot be
+# rendered, e.g., for lack of a width, is reported and counted as failed
+# while the rest are rendered
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="render JSON lines diagram descriptions as text and SVG")
+  parser.add_argument("descriptions", help="JSON lines file, - for stdin")
+  parser.add_argument("directory", help="output directory")
+  parser.add_argument("-s", "--style", choices=("1", "2"), default="1",
+                      help="factory style: 1 instance methods (diagram1), "
+                      "2 class methods (diagram2)")
+  parser.add_argument("-j", "--workers", type=int, default=None)
+  parser.add_argument("-c", "--chunksize", type=int, default=16)
+  args = parser.parse_args()
+  if args.style == "1":
+    factories = [diagram1.DiagramFactory(), diagram1.SvgDiagramFactory()]
+  else:
+    factories = [diagram2.DiagramFactory, diagram2.SvgDiagramFactory]
+  if args.descriptions == "-":
+    descriptions = read_descriptions(sys.stdin)
+  else:
+    descriptions = read_descriptions(args.descriptions)
+  stats = render_batch(descriptions, factories, args.directory,
+                       args.workers, args.chunksize)
+  report(stats)
+
+def read_descriptions(filenameOrFile):
+  file = None if isinstance(filenameOrFile, str) else filenameOrFile
+  try:
+    if file is None:
+      file = open(filenameOrFile, encoding='utf-8')
+    for line in file:
+      if line.strip():
+        yield json.loads(line)
+  finally:
+    if isinstance(filenameOrFile, str) and file:
+      file.close()
+
+def build_diagram(factory, description):
+  diagram = factory.make_diagram(description["width"], description["height"])
+  for rectangle in description.get("rectangles", ()):
+    diagram.add(factory.make_rectangle(*rectangle))
+  for text in description.get("texts", ()):
+    diagram.add(factory.make_text(*text))
+  return diagram
+
+def factory_name(factory):
+  return (factory if isinstance(factory, type) else type(factory)).__name__
+
+def _suffixes(factories):
+  names = [factory_name(factory) for factory in factories]
+  if len(set(names)) != len(names):
+    raise ValueError("factories must have different names")
+  extensions = collections.Counter(factory.extension for factory in factories)
+  return [factory.extension if extensions[factory.extension] == 1 else
+          ".{}{}".format(name, factory.extension)
+          for name, factory in zip(names, factories)]
+
+def render_chunk(factories, suffixes, chunk, directory):
+  # Runs in a worker process and writes its outputs itself so that only
+  # the per-output statistics travel back to the parent: (factory name,
+  # size, seconds) for each output, the size being None for one that
+  # failed
+  results = []
+  for number, description in chunk:
+    for factory, suffix in zip(factories, suffixes):
+      start = time.perf_counter()
+      filename = os.path.join(directory, description["name"] + suffix)
+      try:
+        build_diagram(factory, description).save(filename)
+        size = os.path.getsize(filename)
+      except Exception as err:
+        print("failed {} description {} {!r}: {}: {}".format(
+              factory_name(factory), number, description["name"],
+              type(err).__name__, err), file=sys.stderr)
+        size = None
+      results.append((factory_name(factory), size,
+                      time.perf_counter() - start))
+  return results
+
+Stats = collections.namedtuple("Stats",
+                               "count bytes seconds elapsed failures")
+
+def render_batch(descriptions, factories, directory, workers=None,
+                 chunksize=16):
+  # Chunks are submitted as earlier ones complete so that at most two
+  # chunks per worker are in flight, whatever the number of descriptions
+  suffixes = _suffixes(factories)
+  os.makedirs(directory, exist_ok=True)
+  workers = workers or os.cpu_count() or 1
+  totals = collections.defaultdict(lambda: [0, 0, 0.0, 0])
+  start = time.perf_counter()
+  with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+    pending = set()
+    for chunk in _chunks(descriptions, chunksize):
+      pending.add(executor.submit(render_chunk, factories, suffixes, chunk,
+                                  directory))
+      if len(pending) >= workers * 2:
+        done, pending = concurrent.futures.wait(
+          pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        _tally(totals, done)
+    _tally(totals, concurrent.futures.as_completed(pending))
+  elapsed = time.perf_counter() - start
+  return {name: Stats(count, size, seconds, elapsed, failures)
+          for name, (count, size, seconds, failures) in totals.items()}
+
+def _chunks(descriptions, chunksize):
+  # Yields lists of up to chunksize (number, description) pairs
+  numbered = enumerate(descriptions)
+  while True:
+    numberedChunk = list(itertools.islice(numbered, chunksize))
+    if not numberedChunk:
+      return
+    chunk = []
+    for i, description in numberedChunk:
+      if not isinstance(description, dict):
+        print("skipped description {}: not an object".format(i),
+              file=sys.stderr)
+        continue
+      if "name" not in description:
+        description = dict(description, name="diagram{:06d}".format(i))
+      elif not valid_name(description["name"]):
+        print("skipped description {}: bad name {!r}".format(
+              i, description["name"]), file=sys.stderr)
+        continue
+      chunk.append((i, description))
+    if chunk:
+      yield chunk
+
+def valid_name(name):
+  # A name becomes a file name in the output directory, so it must not
+  # lead out of it
+  return (isinstance(name, str) and name != "" and ".." not in name and
+          not any(separator in name for separator in ("/", os.sep, os.altsep)
+                  if separator))
+
+def _tally(totals, futures):
+  for future in futures:
+    for name, size, seconds in future.result():
+      total = totals[name]
+      if size is None:
+        total[3] += 1
+        continue
+      total[0] += 1
+      total[1] += size
+      total[2] += seconds
+
+def report(stats):
+  for name, (count, size, seconds, elapsed, failures) in sorted(
+      stats.items()):
+    elapsed = elapsed or 1e-9
+    print("{}: {:,} diagrams, {:,} bytes in {:.2f}s ({:,.0f} diagrams/s, "
+          "{:.1f} MB/s, {:.2f}ms each){}".format(name, count, size,
+          elapsed, count / elapsed, size / elapsed / 1e6,
+          1000 * seconds / max(count, 1),
+          ", {:,} failed".format(failures) if failures else ""))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import diagram1
+import diagram2
+
+
+# Measures both factory styles: component construction, Diagram.add()
+# throughput, save() throughput and peak memory, as the diagram size and
+# the number of components grow. Each timing is the best of --repeat runs;
+# memory is measured in a separate run since tracemalloc slows everything.
+# With --compare the exit status is 1 if there were any regressions
+
+SIZES = ((80, 40), (400, 200), (2000, 1000))
+COUNTS = (100, 1000, 10000)
+MIN_SECONDS = 0.001
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="benchmark the diagram1 and diagram2 factories")
+  parser.add_argument("-o", "--output", help="write the results as JSON")
+  parser.add_argument("-c", "--compare",
+                      help="JSON results of an earlier run to compare with")
+  parser.add_argument("-t", "--threshold", type=float, default=0.2,
+                      help="slowdown ratio reported as a regression")
+  parser.add_argument("-r", "--repeat", type=int, default=3)
+  parser.add_argument("-q", "--quick", action="store_true",
+                      help="only the smallest size and count")
+  args = parser.parse_args()
+  sizes = SIZES[:1] if args.quick else SIZES
+  counts = COUNTS[:1] if args.quick else COUNTS
+  results = dict(meta=metadata(), results=run(sizes, counts, args.repeat))
+  for result in results["results"]:
+    print("{style} {factory:8} {width:>4}x{height:<4} {components:>6}: "
+          "make {make:.4f}s add {add:.4f}s save {save:.4f}s "
+          "({bytes:,} bytes) peak {peak:,} bytes, {component:.0f} bytes "
+          "per component".format(**result))
+  if args.output:
+    with open(args.output, 'w', encoding='utf-8') as file:
+      json.dump(results, file, indent=2)
+    print("wrote", args.output)
+  if args.compare:
+    with open(args.compare, encoding='utf-8') as file:
+      regressions = compare(json.load(file)["results"], results["results"],
+                            args.threshold)
+    if regressions:
+      sys.exit(1)
+
+def factories():
+  yield "1", "text", diagram1.DiagramFactory()
+  yield "1", "compact", diagram1.CompactDiagramFactory()
+  yield "1", "svg", diagram1.SvgDiagramFactory()
+  yield "2", "text", diagram2.DiagramFactory
+  yield "2", "compact", diagram2.CompactDiagramFactory
+  yield "2", "svg", diagram2.SvgDiagramFactory
+
+def metadata():
+  try:
+    commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                            capture_output=True, text=True,
+                            cwd=os.path.dirname(os.path.abspath(__file__))
+                            ).stdout.strip()
+  except OSError:
+    commit = ""
+  return dict(commit=commit, python=platform.python_version(),
+              platform=platform.platform(), time=time.time())
+
+def run(sizes, counts, repeat):
+  results = []
+  with tempfile.TemporaryDirectory() as directory:
+    for style, name, factory in factories():
+      filename = os.path.join(directory, "diagram" + factory.extension)
+      for width, height in sizes:
+        for count in counts:
+          make = add = save = float("inf")
+          for _ in range(repeat):
+            timings = measure(factory, width, height, count, filename)
+            make = min(make, timings[0])
+            add = min(add, timings[1])
+            save = min(save, timings[2])
+          results.append(dict(style=style, factory=name, width=width,
+                              height=height, components=count, make=make,
+                              add=add, save=save,
+                              bytes=os.path.getsize(filename),
+                              peak=peak_memory(factory, width, height,
+                                               count),
+                              component=component_memory(factory, width,
+                                                         height, count)))
+  return results
+
+def make_components(factory, width, height, count):
+  components = []
+  for i in range(count):
+    x = (i * 7) % max(width - 10, 1)
+    y = (i * 3) % max(height - 5, 1)
+    if i % 2:
+      components.append(factory.make_rectangle(x, y, 10, 5, "yellow"))
+    else:
+      components.append(factory.make_text(x, y, "Text"))
+  return components
+
+def build(factory, width, height, count):
+  diagram = factory.make_diagram(width, height)
+  for component in make_components(factory, width, height, count):
+    diagram.add(component)
+  return diagram
+
+def measure(factory, width, height, count, filename):
+  start = time.perf_counter()
+  components = make_components(factory, width, height, count)
+  made = time.perf_counter()
+  diagram = factory.make_diagram(width, height)
+  for component in components:
+    diagram.add(component)
+  added = time.perf_counter()
+  diagram.save(filename)
+  saved = time.perf_counter()
+  return made - start, added - made, saved - added
+
+def peak_memory(factory, width, height, count):
+  # Measured from a cold sprite cache, as the first diagram would be
+  diagram1.SPRITES.clear()
+  diagram2.DiagramFactory.SPRITES.clear()
+  tracemalloc.start()
+  try:
+    build(factory, width, height, count)
+    return tracemalloc.get_traced_memory()[1]
+  finally:
+    tracemalloc.stop()
+
+def component_memory(factory, width, height, count):
+  make_components(factory, width, height, 1) # Warm the sprite cache
+  tracemalloc.start()
+  try:
+    components = make_components(factory, width, height, count)
+    return tracemalloc.get_traced_memory()[0] / count
+  finally:
+    tracemalloc.stop()
+
+def compare(old, new, threshold):
+  key = lambda result: (result["style"], result["factory"], result["width"],
+                        result["height"], result["components"])
+  old = {key(result): result for result in old}
+  regressions = 0
+  for result in new:
+    before = old.get(key(result))
+    if before is None:
+      continue
+    before.setdefault("component", 0)
+    for measurement in ("make", "add", "save", "peak", "component"):
+      # Timings under a millisecond are too noisy to compare
+      if (measurement in ("make", "add", "save") and
+          result[measurement] < MIN_SECONDS):
+        continue
+      if before[measurement] and (result[measurement] / before[measurement] >
+                                  1 + threshold):
+        regressions += 1
+        print("REGRESSION {} {} {}x{} {}: {} {:.4g} -> {:.4g}".format(
+              *key(result), measurement, before[measurement],
+              result[measurement]))
+  print("{} regression{}".format(regressions, "" if regressions == 1 else "s"))
+  return regressions
+
+if __name__ == '__main__':
+  main()
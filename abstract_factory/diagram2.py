@@ -1,6 +1,14 @@
+import collections
+import io
+import itertools
+import mmap
 import os
 import sys
 import tempfile
+try:
+  import numpy
+except ImportError:
+  numpy = None
 
 
 textFilename = './diagram.txt'
@@ -33,6 +41,8 @@ def main():
 
 
 class DiagramFactory:
+  extension = '.txt'
+
   @classmethod
   def make_diagram(Class, width, height):
     return Class.Diagram(width, height)
@@ -45,6 +55,15 @@ class DiagramFactory:
   def make_text(Class, x, y, text, fontsize=12):
     return Class.Text(x, y, text, fontsize)
 
+  @classmethod
+  def make_rectangles(Class, xs, ys, widths, heights, fills='white',
+                      strokes='black'):
+    return Class.RectangleBlock(xs, ys, widths, heights, fills, strokes)
+
+  @classmethod
+  def make_texts(Class, xs, ys, texts, fontsizes=12):
+    return Class.TextBlock(xs, ys, texts, fontsizes)
+
   BLANK = ' '
   CORNER = '+'
   HORIZONTAL = '-'
@@ -54,36 +73,284 @@ class DiagramFactory:
     def __init__(self, width, height):
       self.width = width
       self.height = height
-      self.diagram = DiagramFactory._create_rectangle(self.width, self.height, DiagramFactory.BLANK)
+      # The canvas is drawn directly rather than through the sprite cache,
+      # which would otherwise keep a copy of it
+      self.diagram = [list(row) for row in DiagramFactory._rectangle_rows(
+                      self.width, self.height, DiagramFactory.BLANK)]
+      self.components = DiagramFactory.SpatialIndex()
 
     def add(self, component):
-      for y, row in enumerate(component.rows):
-        for x, char in enumerate(row):
-          self.diagram[y + component.y][x + component.x] = char
-
-    def save(self, filenameOrFile):
+      if (isinstance(component, DiagramFactory.ComponentBlock) and
+          not len(component)):
+        return # An empty block has nothing to draw or find
+      # A component, or block member, is only indexed once it is drawn
+      if isinstance(component, DiagramFactory.ComponentBlock):
+        for member, ((x, y, rows), bounds) in enumerate(zip(
+            component, component.member_bounds())):
+          self._blit(x, y, rows)
+          self.components.insert((component, member), bounds)
+      else:
+        self._blit(component.x, component.y, component.rows)
+        self.components.insert(component, component.bounds)
+
+    def _blit(self, x, y, rows):
+      for dy, row in enumerate(rows):
+        for dx, char in enumerate(row):
+          self.diagram[y + dy][x + dx] = char
+
+    # Block members are found one at a time, as (block, index) pairs
+    def components_at(self, x, y):
+      return self.components.query(x, y, 1, 1)
+
+    def components_in(self, x, y, width, height):
+      return self.components.query(x, y, width, height)
+
+    def save(self, filenameOrFile, viewport=None):
+      # The canvas already holds every component so a viewport (x, y,
+      # width, height) is saved by cropping it
+      rows = self.diagram
+      if viewport is not None:
+        x, y, width, height = DiagramFactory._clip(viewport, self.width, self.height)
+        rows = [row[x:x + width] for row in rows[y:y + height]]
       file = None if isinstance(filenameOrFile, str) else filenameOrFile
       try:
         if file is None:
           file = open(filenameOrFile, 'w', encoding='utf-8')
-        for row in self.diagram:
+        for row in rows:
           # print(''.join(row), file=file)
           file.write(''.join(row) + '\n')
       finally:
         if isinstance(filenameOrFile, str) and file:
           file.close()
 
+  # Components use __slots__ and share their rows: rectangles through the
+  # sprite cache and texts through interned strings
+
   class Rectangle:
+    __slots__ = ('x', 'y', 'rows')
+
     def __init__(self, x, y, width, height, fill, stroke):
       self.x = x
       self.y = y
-      self.rows = DiagramFactory._create_rectangle(width, height, DiagramFactory.BLANK if fill == 'white' else '%')
+      self.rows = DiagramFactory.SPRITES.get(width, height, DiagramFactory.BLANK if fill == 'white' else '%')
+
+    @property
+    def bounds(self):
+      return (self.x, self.y, len(self.rows[0]) if self.rows else 0,
+              len(self.rows))
 
   class Text:
+    __slots__ = ('x', 'y', 'text')
+
     def __init__(self, x, y, text, fontsize):
       self.x = x
       self.y = y
-      self.rows = [list(text)]
+      self.text = sys.intern(text)
+
+    @property
+    def rows(self):
+      return (self.text,)
+
+    @property
+    def bounds(self):
+      return (self.x, self.y, len(self.text), 1)
+
+  class SpatialIndex:
+    # Uniform grid of cellSize square cells, each listing the ordinals of
+    # the items that overlap it; items spanning more than MAX_CELLS cells
+    # are kept in a separate list that every query checks. Queries return
+    # items in the order they were inserted, i.e., bottom to top
+    MAX_CELLS = 64
+
+    def __init__(self, cellSize=32):
+      self.cellSize = cellSize
+      self.items = []
+      self.bounds = []
+      self.cells = collections.defaultdict(list)
+      self.large = []
+
+    def __len__(self):
+      return len(self.items)
+
+    def insert(self, item, bounds):
+      ordinal = len(self.items)
+      self.items.append(item)
+      self.bounds.append(bounds)
+      columns, rows = self._span(*bounds)
+      if len(columns) * len(rows) > self.MAX_CELLS:
+        self.large.append(ordinal)
+      else:
+        for cell in itertools.product(columns, rows):
+          self.cells[cell].append(ordinal)
+
+    def query(self, x, y, width, height):
+      area = (x, y, width, height)
+      intersects = DiagramFactory._intersects
+      found = {ordinal for ordinal in self.large
+               if intersects(self.bounds[ordinal], area)}
+      columns, rows = self._span(*area)
+      for cell in itertools.product(columns, rows):
+        for ordinal in self.cells.get(cell, ()):
+          if ordinal not in found and intersects(self.bounds[ordinal], area):
+            found.add(ordinal)
+      return [self.items[ordinal] for ordinal in sorted(found)]
+
+    def _span(self, x, y, width, height):
+      size = self.cellSize
+      return (range(int(x // size), int((x + max(width, 1) - 1) // size) + 1),
+              range(int(y // size), int((y + max(height, 1) - 1) // size) + 1))
+
+  def _intersects(bounds, area):
+    x, y, width, height = bounds
+    areaX, areaY, areaWidth, areaHeight = area
+    return (x < areaX + areaWidth and areaX < x + width and
+            y < areaY + areaHeight and areaY < y + height)
+
+  def _insert(index, component):
+    # Each member of a block is indexed as its own (block, index) item so
+    # that queries and viewports only touch the members they overlap
+    if isinstance(component, DiagramFactory.ComponentBlock):
+      for member, bounds in enumerate(component.member_bounds()):
+        index.insert((component, member), bounds)
+    else:
+      index.insert(component, component.bounds)
+
+  def _union(xs, ys, widths, heights):
+    if not xs:
+      return (0, 0, 0, 0)
+    x0 = min(xs)
+    y0 = min(ys)
+    x1 = max(x + width for x, width in zip(xs, widths))
+    y1 = max(y + height for y, height in zip(ys, heights))
+    return (x0, y0, x1 - x0, y1 - y0)
+
+  def _clip(viewport, width, height):
+    x, y, viewWidth, viewHeight = viewport
+    x0 = min(max(x, 0), width)
+    y0 = min(max(y, 0), height)
+    x1 = min(max(x + viewWidth, x0), width)
+    y1 = min(max(y + viewHeight, y0), height)
+    return x0, y0, x1 - x0, y1 - y0
+
+  class SpriteCache:
+    # Bounded LRU cache of rasterized rectangles keyed by (width, height,
+    # fill); each sprite is a tuple of row strings so it can be shared. The
+    # cache holds at most capacity sprites of at most maxCharacters
+    # characters in all; sprites of more than a sixteenth of that are made
+    # afresh each time rather than cached
+    def __init__(self, capacity=256, maxCharacters=1 << 22):
+      self.capacity = capacity
+      self.maxCharacters = maxCharacters
+      self.sprites = collections.OrderedDict()
+      self.characters = 0
+      self.hits = self.misses = self.evictions = 0
+
+    def get(self, width, height, fill):
+      key = (width, height, fill)
+      try:
+        sprite = self.sprites[key]
+      except KeyError:
+        self.misses += 1
+        sprite = DiagramFactory._rectangle_rows(width, height, fill)
+        if width * height <= self.maxCharacters // 16:
+          self.sprites[key] = sprite
+          self.characters += width * height
+          self._evict()
+      else:
+        self.hits += 1
+        self.sprites.move_to_end(key)
+      return sprite
+
+    def resize(self, capacity):
+      self.capacity = capacity
+      self._evict()
+
+    def clear(self):
+      self.sprites.clear()
+      self.characters = 0
+      self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+      return dict(capacity=self.capacity, size=len(self.sprites),
+                  characters=self.characters, hits=self.hits,
+                  misses=self.misses, evictions=self.evictions)
+
+    def _evict(self):
+      while (len(self.sprites) > self.capacity or
+             self.characters > self.maxCharacters):
+        (width, height, _), _ = self.sprites.popitem(last=False)
+        self.characters -= width * height
+        self.evictions += 1
+
+  SPRITES = SpriteCache()
+
+  # A block holds many components of one kind as columns, one entry per
+  # component; a column given as a single value applies to every component
+  class ComponentBlock:
+    def __len__(self):
+      return len(self.xs)
+
+  class RectangleBlock(ComponentBlock):
+    def __init__(self, xs, ys, widths, heights, fills, strokes):
+      count = DiagramFactory._count(xs, ys, widths, heights, fills, strokes)
+      self.xs = DiagramFactory._column(xs, count)
+      self.ys = DiagramFactory._column(ys, count)
+      self.widths = DiagramFactory._column(widths, count)
+      self.heights = DiagramFactory._column(heights, count)
+      self.fills = DiagramFactory._column(fills, count)
+      self.strokes = DiagramFactory._column(strokes, count)
+
+    @property
+    def bounds(self):
+      return DiagramFactory._union(self.xs, self.ys, self.widths, self.heights)
+
+    def member_bounds(self):
+      return zip(self.xs, self.ys, self.widths, self.heights)
+
+    def __iter__(self):
+      for x, y, width, height, fill in zip(self.xs, self.ys, self.widths,
+                                           self.heights, self.fills):
+        yield x, y, DiagramFactory.SPRITES.get(width, height,
+            DiagramFactory.BLANK if fill == 'white' else '%')
+
+  class TextBlock(ComponentBlock):
+    def __init__(self, xs, ys, texts, fontsizes):
+      count = DiagramFactory._count(xs, ys, texts, fontsizes)
+      self.xs = DiagramFactory._column(xs, count)
+      self.ys = DiagramFactory._column(ys, count)
+      self.texts = DiagramFactory._column(texts, count)
+      self.fontsizes = DiagramFactory._column(fontsizes, count)
+
+    @property
+    def bounds(self):
+      return DiagramFactory._union(self.xs, self.ys,
+          [len(text) for text in self.texts], itertools.repeat(1))
+
+    def member_bounds(self):
+      for x, y, text in zip(self.xs, self.ys, self.texts):
+        yield x, y, len(text), 1
+
+    def __iter__(self):
+      for x, y, text in zip(self.xs, self.ys, self.texts):
+        yield x, y, (text,)
+
+  def _count(*columns):
+    counts = {len(values) for values in columns
+              if not isinstance(values, (str, int, float))}
+    if not counts:
+      raise ValueError("a block needs at least one column with a value per "
+                       "component")
+    if len(counts) > 1:
+      raise ValueError("a block's columns must all have the same length, "
+                       "not {}".format(sorted(counts)))
+    return counts.pop()
+
+  def _column(values, count):
+    if isinstance(values, (str, int, float)):
+      return [values] * count
+    if numpy is not None and isinstance(values, numpy.ndarray):
+      return values.tolist()
+    return list(values)
 
   def _create_rectangle(width, height, fill):
     rows = [[fill for _ in range(width)] for _ in range(height)]
@@ -101,9 +368,150 @@ class DiagramFactory:
       rows[y][x] = DiagramFactory.CORNER
     return rows
 
+  def _rectangle_rows(width, height, fill):
+    # What _create_rectangle() draws, as a tuple of row strings built a row
+    # at a time; the middle rows are all one shared string
+    if width < 1 or height < 1:
+      return ()
+    def row(end, inner):
+      return end if width == 1 else end + inner * (width - 2) + end
+    top = row(DiagramFactory.CORNER, DiagramFactory.HORIZONTAL)
+    if height == 1:
+      return (top,)
+    return (top,) + (row(DiagramFactory.VERTICAL, fill),) * (height - 2) + (
+            top,)
+
+
+class CompactDiagramFactory(DiagramFactory):
+  # The make_* class methods and the Rectangle and Text classes are inherited
+
+  # Single-byte encoding so that every character is exactly one byte wide;
+  # characters outside it are written as '?'
+  ENCODING = 'latin-1'
+
+  class Diagram(DiagramFactory.Diagram):
+    # The canvas is one flat bytearray holding height rows of width + 1
+    # bytes, the last byte of each row being the newline, so save() can
+    # write the buffer as it is
+    def __init__(self, width, height):
+      self.width = width
+      self.height = height
+      self.stride = width + 1
+      rows = DiagramFactory._rectangle_rows(self.width, self.height,
+                                            DiagramFactory.BLANK)
+      encode = CompactDiagramFactory._encode_row
+      self.buffer = bytearray()
+      if rows:
+        self.buffer = bytearray(encode(rows[-1]) + b'\n') * self.height
+        self.buffer[:self.stride] = encode(rows[0]) + b'\n'
+        if self.height > 2:
+          middle = encode(rows[1]) + b'\n'
+          for y in range(1, self.height - 1):
+            self.buffer[y * self.stride:(y + 1) * self.stride] = middle
+      # Rows changed since the diagram was last saved to savedFilename
+      self.dirty = set()
+      self.savedFilename = None
+      self.components = DiagramFactory.SpatialIndex()
+
+    def _blit(self, x, y, rows):
+      for dy, row in enumerate(rows):
+        row_y = y + dy
+        if not 0 <= row_y < self.height:
+          continue
+        data = CompactDiagramFactory._encode_row(row)
+        if x < 0:
+          data = data[-x:]
+        start = row_y * self.stride + max(x, 0)
+        data = data[:max(0, self.width - max(x, 0))]
+        self.buffer[start:start + len(data)] = data
+        self.dirty.add(row_y)
+
+    def save(self, filenameOrFile, viewport=None, *, incremental=False):
+      if viewport is not None:
+        self._save_viewport(filenameOrFile, viewport)
+        return
+      # An incremental save of the file last saved to rewrites only the
+      # dirty rows in place, which is possible since every row has the
+      # same length in bytes
+      if (incremental and filenameOrFile == self.savedFilename and
+          os.path.isfile(filenameOrFile) and
+          os.path.getsize(filenameOrFile) == len(self.buffer)):
+        self._save_dirty_rows(filenameOrFile)
+        return
+      file = None if isinstance(filenameOrFile, str) else filenameOrFile
+      try:
+        if file is None:
+          file = open(filenameOrFile, 'wb')
+        if isinstance(file, io.TextIOBase):
+          file.write(self.buffer.decode(CompactDiagramFactory.ENCODING))
+        else:
+          file.write(self.buffer)
+      finally:
+        if isinstance(filenameOrFile, str) and file:
+          file.close()
+      if isinstance(filenameOrFile, str):
+        self.savedFilename = filenameOrFile
+        self.dirty.clear()
+
+    def _save_viewport(self, filenameOrFile, viewport):
+      x, y, width, height = DiagramFactory._clip(viewport, self.width, self.height)
+      buffer = memoryview(self.buffer)
+      rows = []
+      for row_y in range(y, y + height):
+        start = row_y * self.stride + x
+        rows.append(buffer[start:start + width])
+        rows.append(b'\n')
+      file = None if isinstance(filenameOrFile, str) else filenameOrFile
+      try:
+        if file is None:
+          file = open(filenameOrFile, 'wb')
+        data = b''.join(rows)
+        if isinstance(file, io.TextIOBase):
+          file.write(data.decode(CompactDiagramFactory.ENCODING))
+        else:
+          file.write(data)
+      finally:
+        if isinstance(filenameOrFile, str) and file:
+          file.close()
+
+    def _save_dirty_rows(self, filename):
+      if not self.dirty:
+        return
+      buffer = memoryview(self.buffer)
+      with open(filename, 'r+b') as file:
+        with mmap.mmap(file.fileno(), 0) as view:
+          for first, last in CompactDiagramFactory._runs(sorted(self.dirty)):
+            start = first * self.stride
+            end = (last + 1) * self.stride
+            view[start:end] = buffer[start:end]
+      self.dirty.clear()
+
+  def _encode_row(row):
+    if not isinstance(row, str):
+      row = ''.join(row)
+    return row.encode(CompactDiagramFactory.ENCODING, 'replace')
+
+  def _runs(rows):
+    first = last = None
+    for row in rows:
+      if last is not None and row == last + 1:
+        last = row
+        continue
+      if first is not None:
+        yield first, last
+      first = last = row
+    if first is not None:
+      yield first, last
+
 
 class SvgDiagramFactory(DiagramFactory):
   # The make_* class methods are inherited
+
+  extension = '.svg'
+
+  @classmethod
+  def make_streaming_diagram(Class, width, height, filenameOrFile):
+    return Class.StreamingDiagram(width, height, filenameOrFile)
   
   SVG_START = """<?xml version="1.0" encoding="UTF-8" standalone="no"?>
 <!DOCTYPE svg PUBLIC "-//W3C//DTD SVG 20010904//EN"
@@ -120,45 +528,266 @@ height="{height}" fill="{fill}" stroke="{stroke}"/>"""
   SVG_TEXT = """<text x="{x}" y="{y}" text-anchor="left" \
 font-family="sans-serif" font-size="{fontsize}">{text}</text>"""
 
+  SVG_VIEWPORT_START = '<g transform="translate({x},{y})">'
+
+  SVG_VIEWPORT_END = '</g>'
+
   SVG_SCALE = 20
 
+  BUFFER_SIZE = 1 << 16
+
   class Diagram:
     def __init__(self, width, height):
+      self.width = width
+      self.height = height
       pxwidth = width * SvgDiagramFactory.SVG_SCALE
       pxheight = height * SvgDiagramFactory.SVG_SCALE
-      self.diagram = [SvgDiagramFactory.SVG_START.format(**locals())]
-      outline = SvgDiagramFactory.Rectangle(0, 0, width, height, 'lightgreen', 'black')
-      self.diagram.append(outline.svg)
+      self.header = SvgDiagramFactory.SVG_START.format(**locals())
+      # The components are only formatted as SVG when the diagram is saved
+      self.outline = SvgDiagramFactory.Rectangle(0, 0, width, height, 'lightgreen', 'black')
+      self.diagram = [self.outline]
+      self.components = DiagramFactory.SpatialIndex()
 
     def add(self, component):
-      self.diagram.append(component.svg)
-
-    def save(self, filenameOrFile):
+      if (isinstance(component, DiagramFactory.ComponentBlock) and
+          not len(component)):
+        return
+      self.diagram.append(component)
+      DiagramFactory._insert(self.components, component)
+
+    def components_at(self, x, y):
+      return self.components.query(x, y, 1, 1)
+
+    def components_in(self, x, y, width, height):
+      return self.components.query(x, y, width, height)
+
+    def save(self, filenameOrFile, viewport=None):
+      if viewport is None:
+        header = self.header
+        svgs = (component.svg for component in self.diagram)
+      else:
+        header, svgs = self._viewport(*viewport)
       file = None if isinstance(filenameOrFile, str) else filenameOrFile
       try:
         if file is None:
           file = open(filenameOrFile, 'w', encoding='utf-8')
-        file.write('\n'.join(self.diagram))
+        file.write(header)
+        file.writelines('\n' + svg for svg in svgs)
+        if viewport is not None:
+          file.write('\n' + SvgDiagramFactory.SVG_VIEWPORT_END)
         file.write('\n' + SvgDiagramFactory.SVG_END)
       finally:
         if isinstance(filenameOrFile, str) and file:
           file.close()
 
+    def _viewport(self, x, y, width, height):
+      # Only the components, and block members, that intersect the
+      # viewport are written, shifted so that the viewport's top-left
+      # corner is at the origin
+      scale = SvgDiagramFactory.SVG_SCALE
+      header = '\n'.join((
+        SvgDiagramFactory.SVG_START.format(pxwidth=width * scale,
+                                           pxheight=height * scale),
+        SvgDiagramFactory.SVG_VIEWPORT_START.format(x=-x * scale,
+                                                    y=-y * scale)))
+      svgs = [self.outline.svg]
+      for item in self.components.query(x, y, width, height):
+        if isinstance(item, tuple):
+          block, index = item
+          svgs.append(block.member_svg(index))
+        else:
+          svgs.append(item.svg)
+      return header, svgs
+
+  class StreamingDiagram:
+    # Writes the header as soon as it is created and each component as it
+    # is added, so nothing but the file buffer is held in memory; the
+    # output is identical to Diagram.save()
+    def __init__(self, width, height, filenameOrFile,
+                 bufferSize=None):
+      self.filenameOrFile = filenameOrFile
+      if isinstance(filenameOrFile, str):
+        self.file = open(filenameOrFile, 'w', encoding='utf-8',
+                         buffering=bufferSize or SvgDiagramFactory.BUFFER_SIZE)
+      else:
+        self.file = filenameOrFile
+      pxwidth = width * SvgDiagramFactory.SVG_SCALE
+      pxheight = height * SvgDiagramFactory.SVG_SCALE
+      self.file.write(SvgDiagramFactory.SVG_START.format(pxwidth=pxwidth,
+                                                         pxheight=pxheight))
+      outline = SvgDiagramFactory.Rectangle(0, 0, width, height, 'lightgreen', 'black')
+      self.add(outline)
+
+    def add(self, component):
+      if (isinstance(component, DiagramFactory.ComponentBlock) and
+          not len(component)):
+        return
+      self.file.write('\n' + component.svg)
+
+    def save(self, filenameOrFile=None):
+      # The components have already been written, saving finishes the file;
+      # it can only be saved to where it was opened
+      if (filenameOrFile is not None and not
+          SvgDiagramFactory._same_target(filenameOrFile,
+                                         self.filenameOrFile)):
+        raise ValueError("a streaming diagram can only be saved to {!r}"
+                         .format(self.filenameOrFile))
+      self.close()
+
+    def close(self):
+      if self.file is None:
+        return
+      try:
+        self.file.write('\n' + SvgDiagramFactory.SVG_END)
+      finally:
+        if isinstance(self.filenameOrFile, str):
+          self.file.close()
+        else:
+          self.file.flush()
+        self.file = None
+
+    def __enter__(self):
+      return self
+
+    def abort(self):
+      # Closes the file without finishing it, removing it if it was opened
+      # by name, so that a failed export never looks complete
+      if self.file is None:
+        return
+      if isinstance(self.filenameOrFile, str):
+        self.file.close()
+        os.remove(self.filenameOrFile)
+      else:
+        self.file.flush()
+      self.file = None
+
+    def __exit__(self, excType, *exc_info):
+      if excType is None:
+        self.close()
+      else:
+        self.abort()
+
+  def _same_target(filenameOrFile, other):
+    if isinstance(filenameOrFile, str) and isinstance(other, str):
+      return os.path.abspath(filenameOrFile) == os.path.abspath(other)
+    return filenameOrFile is other
+
+  # SVG components keep their fields in diagram units and only format
+  # themselves when their svg is asked for
 
   class Rectangle:
+    __slots__ = ('x', 'y', 'width', 'height', 'fill', 'stroke')
+
     def __init__(self, x, y, width, height, fill, stroke):
-      x *= SvgDiagramFactory.SVG_SCALE
-      y *= SvgDiagramFactory.SVG_SCALE
-      width *= SvgDiagramFactory.SVG_SCALE
-      height *= SvgDiagramFactory.SVG_SCALE
-      self.svg = SvgDiagramFactory.SVG_RECTANGLE.format(**locals())
+      self.x = x
+      self.y = y
+      self.width = width
+      self.height = height
+      self.fill = sys.intern(fill)
+      self.stroke = sys.intern(stroke)
+
+    @property
+    def bounds(self):
+      return (self.x, self.y, self.width, self.height)
+
+    @property
+    def svg(self):
+      scale = SvgDiagramFactory.SVG_SCALE
+      return SvgDiagramFactory.SVG_RECTANGLE.format(x=self.x * scale,
+          y=self.y * scale, width=self.width * scale,
+          height=self.height * scale, fill=self.fill, stroke=self.stroke)
 
   class Text:
+    __slots__ = ('x', 'y', 'text', 'fontsize')
+
     def __init__(self, x, y, text, fontsize):
-      x *= SvgDiagramFactory.SVG_SCALE
-      y *= SvgDiagramFactory.SVG_SCALE
-      fontsize *= SvgDiagramFactory.SVG_SCALE // 10
-      self.svg = SvgDiagramFactory.SVG_TEXT.format(**locals())
+      self.x = x
+      self.y = y
+      self.text = sys.intern(text)
+      self.fontsize = fontsize
+
+    @property
+    def bounds(self):
+      return (self.x, self.y, len(self.text), 1)
+
+    @property
+    def svg(self):
+      scale = SvgDiagramFactory.SVG_SCALE
+      return SvgDiagramFactory.SVG_TEXT.format(x=self.x * scale,
+          y=self.y * scale, text=self.text,
+          fontsize=self.fontsize * (scale // 10))
+
+  class RectangleBlock(DiagramFactory.ComponentBlock):
+    # The whole block is formatted in one pass into a single svg string
+    # that diagrams add like any single component's
+    def __init__(self, xs, ys, widths, heights, fills, strokes):
+      scale = SvgDiagramFactory.SVG_SCALE
+      count = DiagramFactory._count(xs, ys, widths, heights, fills, strokes)
+      self.xs = SvgDiagramFactory._scaled(xs, count, scale)
+      self.ys = SvgDiagramFactory._scaled(ys, count, scale)
+      self.widths = SvgDiagramFactory._scaled(widths, count, scale)
+      self.heights = SvgDiagramFactory._scaled(heights, count, scale)
+      self.fills = DiagramFactory._column(fills, count)
+      self.strokes = DiagramFactory._column(strokes, count)
+      self.bounds = tuple(value / scale for value in
+                          DiagramFactory._union(self.xs, self.ys,
+                                                self.widths, self.heights))
+
+    def member_bounds(self):
+      scale = SvgDiagramFactory.SVG_SCALE
+      for x, y, width, height in zip(self.xs, self.ys, self.widths,
+                                     self.heights):
+        yield x / scale, y / scale, width / scale, height / scale
+
+    def member_svg(self, index):
+      return SvgDiagramFactory.SVG_RECTANGLE.format(x=self.xs[index],
+          y=self.ys[index], width=self.widths[index],
+          height=self.heights[index], fill=self.fills[index],
+          stroke=self.strokes[index])
+
+    @property
+    def svg(self):
+      format = SvgDiagramFactory.SVG_RECTANGLE.format
+      return '\n'.join(format(x=x, y=y, width=width, height=height,
+                              fill=fill, stroke=stroke)
+                       for x, y, width, height, fill, stroke in zip(
+                         self.xs, self.ys, self.widths, self.heights,
+                         self.fills, self.strokes))
+
+  class TextBlock(DiagramFactory.ComponentBlock):
+    def __init__(self, xs, ys, texts, fontsizes):
+      scale = SvgDiagramFactory.SVG_SCALE
+      count = DiagramFactory._count(xs, ys, texts, fontsizes)
+      self.xs = SvgDiagramFactory._scaled(xs, count, scale)
+      self.ys = SvgDiagramFactory._scaled(ys, count, scale)
+      self.texts = DiagramFactory._column(texts, count)
+      self.fontsizes = SvgDiagramFactory._scaled(fontsizes, count, scale // 10)
+      self.bounds = tuple(value / scale for value in
+                          DiagramFactory._union(self.xs, self.ys,
+                              [len(text) * scale for text in self.texts],
+                              itertools.repeat(scale)))
+
+    def member_bounds(self):
+      scale = SvgDiagramFactory.SVG_SCALE
+      for x, y, text in zip(self.xs, self.ys, self.texts):
+        yield x / scale, y / scale, len(text), 1
+
+    def member_svg(self, index):
+      return SvgDiagramFactory.SVG_TEXT.format(x=self.xs[index],
+          y=self.ys[index], text=self.texts[index],
+          fontsize=self.fontsizes[index])
+
+    @property
+    def svg(self):
+      format = SvgDiagramFactory.SVG_TEXT.format
+      return '\n'.join(format(x=x, y=y, text=text, fontsize=fontsize)
+                       for x, y, text, fontsize in zip(
+                         self.xs, self.ys, self.texts, self.fontsizes))
+
+  def _scaled(values, count, scale):
+    if numpy is not None and isinstance(values, numpy.ndarray):
+      return (values * scale).tolist()
+    return [value * scale for value in DiagramFactory._column(values, count)]
 
 if __name__ == '__main__':
   main()
\ No newline at end of file
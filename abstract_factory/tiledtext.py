@@ -0,0 +1,171 @@
+import io
+import mmap
+import struct
+import sys
+
+
+# A tiled text diagram file holds a header, an index of tile offsets and
+# the tiles. Each tile is tileWidth x tileHeight bytes, stored row by row.
+# Bytes never written, such as the padding of the tiles on the right and
+# bottom edges, are NULs, so a new file can be sparse, and read as blanks.
+# Any region can be read (or rewritten) through mmap by touching only the
+# tiles it overlaps, whatever the size of the whole diagram.
+#
+#   header  MAGIC, width, height, tileWidth, tileHeight
+#   index   one little-endian uint64 file offset per tile, row by row
+#   tiles   tileWidth * tileHeight bytes each
+
+MAGIC = b'TDG1'
+HEADER = struct.Struct('<4sIIII')
+OFFSET = struct.Struct('<Q')
+ENCODING = 'latin-1'
+BLANK = b' '
+NUL_TO_BLANK = bytes.maketrans(b'\0', BLANK)
+TILE_SIZE = 64
+
+def main():
+  usage = """usage: tiledtext.py totiled diagram.txt diagram.tdg
+       tiledtext.py totext diagram.tdg diagram.txt
+       tiledtext.py view diagram.tdg x y width height"""
+  if len(sys.argv) == 4 and sys.argv[1] == 'totiled':
+    text_to_tiled(sys.argv[2], sys.argv[3])
+    print("wrote", sys.argv[3])
+  elif len(sys.argv) == 4 and sys.argv[1] == 'totext':
+    tiled_to_text(sys.argv[2], sys.argv[3])
+    print("wrote", sys.argv[3])
+  elif len(sys.argv) == 7 and sys.argv[1] == 'view':
+    with TiledDiagram(sys.argv[2]) as diagram:
+      for line in diagram.read_text(*map(int, sys.argv[3:])):
+        print(line)
+  else:
+    print(usage)
+
+class TiledDiagram:
+  def __init__(self, filename, writable=False):
+    self.file = open(filename, 'r+b' if writable else 'rb')
+    try:
+      self.view = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_WRITE
+                            if writable else mmap.ACCESS_READ)
+    except Exception:
+      self.file.close()
+      raise
+    magic, self.width, self.height, self.tileWidth, self.tileHeight = (
+      HEADER.unpack_from(self.view))
+    if magic != MAGIC:
+      self.close()
+      raise ValueError("{} is not a tiled diagram".format(filename))
+    self.across = -(-self.width // self.tileWidth)
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
+  def close(self):
+    if self.view is not None:
+      self.view.close()
+      self.file.close()
+      self.view = None
+
+  def _offset(self, tileX, tileY):
+    return OFFSET.unpack_from(self.view, HEADER.size + OFFSET.size *
+                              (tileY * self.across + tileX))[0]
+
+  def _spans(self, x, y, width, height):
+    # Yields (row, column, file offset, length) for every tile row slice
+    # inside the region, clipped to the diagram
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + width, self.width), min(y + height, self.height)
+    for row in range(y0, y1):
+      tileY, innerY = divmod(row, self.tileHeight)
+      column = x0
+      while column < x1:
+        tileX, innerX = divmod(column, self.tileWidth)
+        length = min(self.tileWidth - innerX, x1 - column)
+        offset = (self._offset(tileX, tileY) + innerY * self.tileWidth +
+                  innerX)
+        yield row, column, offset, length
+        column += length
+
+  def read(self, x, y, width, height):
+    rows = {}
+    for row, column, offset, length in self._spans(x, y, width, height):
+      rows.setdefault(row, []).append(self.view[offset:offset + length])
+    return [b''.join(rows[row]).translate(NUL_TO_BLANK)
+            for row in sorted(rows)]
+
+  def read_text(self, x, y, width, height):
+    return [row.decode(ENCODING) for row in self.read(x, y, width, height)]
+
+  def write(self, x, y, rows):
+    for dy, row in enumerate(rows):
+      if isinstance(row, str):
+        row = row.encode(ENCODING, 'replace')
+      for _, column, offset, length in self._spans(x, y + dy, len(row), 1):
+        start = column - x
+        self.view[offset:offset + length] = row[start:start + length]
+
+def write_tiled(rows, width, height, filename, tileWidth=TILE_SIZE,
+                tileHeight=TILE_SIZE):
+  # rows is any iterable of bytes rows; short or missing rows are blank
+  across = -(-width // tileWidth)
+  down = -(-height // tileHeight)
+  tileSize = tileWidth * tileHeight
+  dataOffset = HEADER.size + OFFSET.size * across * down
+  with open(filename, 'wb') as file:
+    file.write(HEADER.pack(MAGIC, width, height, tileWidth, tileHeight))
+    file.write(b''.join(OFFSET.pack(dataOffset + i * tileSize)
+                        for i in range(across * down)))
+    file.truncate(dataOffset + across * down * tileSize)
+  if width and height:
+    with TiledDiagram(filename, writable=True) as diagram:
+      for y, row in zip(range(height), rows):
+        diagram.write(0, y, (row[:width],))
+
+def save_tiled(diagram, filename, tileWidth=TILE_SIZE, tileHeight=TILE_SIZE):
+  write_tiled(_diagram_rows(diagram), diagram.width, diagram.height,
+              filename, tileWidth, tileHeight)
+
+def _diagram_rows(diagram):
+  buffer = getattr(diagram, 'buffer', None)
+  if buffer is not None: # A compact diagram
+    buffer = memoryview(buffer)
+    for start in range(0, len(buffer), diagram.stride):
+      yield buffer[start:start + diagram.width]
+  else:
+    for row in diagram.diagram:
+      yield ''.join(row).encode(ENCODING, 'replace')
+
+def text_to_tiled(textFilename, tiledFilename, tileWidth=TILE_SIZE,
+                  tileHeight=TILE_SIZE):
+  # Two passes: the first finds the diagram's size, the second copies it
+  width = height = 0
+  with open(textFilename, 'rb') as file:
+    for line in file:
+      width = max(width, len(line.rstrip(b'\r\n')))
+      height += 1
+  with open(textFilename, 'rb') as file:
+    write_tiled((line.rstrip(b'\r\n') for line in file), width, height,
+                tiledFilename, tileWidth, tileHeight)
+
+def tiled_to_text(tiledFilename, filenameOrFile):
+  file = None if isinstance(filenameOrFile, str) else filenameOrFile
+  try:
+    if file is None:
+      file = open(filenameOrFile, 'wb')
+    with TiledDiagram(tiledFilename) as diagram:
+      # One band of tile rows at a time
+      for y in range(0, diagram.height, diagram.tileHeight):
+        rows = diagram.read(0, y, diagram.width, diagram.tileHeight)
+        data = b''.join(row + b'\n' for row in rows)
+        if isinstance(file, io.TextIOBase):
+          file.write(data.decode(ENCODING))
+        else:
+          file.write(data)
+  finally:
+    if isinstance(filenameOrFile, str) and file:
+      file.close()
+
+if __name__ == '__main__':
+  main()
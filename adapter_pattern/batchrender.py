@@ -0,0 +1,142 @@
+import argparse
+import collections
+import concurrent.futures
+import functools
+import multiprocessing
+import os
+import sys
+import time
+
+import batch
+import render
+
+
+# Each document is a dict such as
+#   {"name": "intro", "title": "Introduction",
+#    "paragraphs": ["The first paragraph.", "The second paragraph."]}
+# where the name is optional; every document is rendered once per format,
+# each to its own file, e.g., intro.txt and intro.html. Documents whose
+# names hold a path separator or ".." are skipped, and a document that
+# cannot be rendered, e.g., for lack of paragraphs, is reported and counted
+# as failed while the rest are rendered
+
+FORMATS = ("txt", "html")
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="render JSON lines documents as text and HTML files")
+  parser.add_argument("documents", help="JSON lines file, - for stdin")
+  parser.add_argument("directory", help="output directory")
+  parser.add_argument("-f", "--formats", default=",".join(FORMATS),
+                      help="comma-separated formats from {}".format(
+                      ", ".join(FORMATS)))
+  parser.add_argument("-w", "--width", type=int, default=80,
+                      help="text width")
+  parser.add_argument("-j", "--workers", type=int, default=None)
+  parser.add_argument("-c", "--chunksize", type=int, default=64)
+  parser.add_argument("-m", "--max-open", type=int, default=16,
+                      help="most output files open at once")
+  args = parser.parse_args()
+  formats = args.formats.split(",")
+  for format in formats:
+    if format not in FORMATS:
+      parser.error("unknown format {}".format(format))
+  if args.documents == "-":
+    documents = batch.read_json_lines(sys.stdin)
+  else:
+    documents = batch.read_json_lines(args.documents)
+  stats = render_batch(documents, formats, args.directory, args.width,
+                       args.workers, args.chunksize, args.max_open)
+  report(stats)
+
+def make_renderer(format, file, width):
+  if format == "txt":
+    return render.TextRenderer(width, file)
+  return render.HtmlRenderer(render.HtmlWriter(file))
+
+# Set in each worker process by _initialize(): a semaphore shared by all
+# the workers that limits how many output files are open at once
+_openFiles = None
+
+def _initialize(openFiles):
+  global _openFiles
+  _openFiles = openFiles
+
+def write_document(document, format, directory, width):
+  # Renders into a temporary file in the output directory and renames it
+  # over the target, so a reader never sees a partly written file; the
+  # temporary name includes the process ID so that no two workers share
+  # one, and unlike mkstemp()'s it gets the usual permissions
+  filename = os.path.join(directory, "{}.{}".format(document["name"],
+                                                    format))
+  temporary = os.path.join(directory, ".{}.{}.{}.tmp".format(
+                           document["name"], format, os.getpid()))
+  with _openFiles:
+    try:
+      with open(temporary, "w", encoding="utf-8") as file:
+        render.Page(document["title"], make_renderer(format, file, width),
+                    document["paragraphs"]).render()
+      os.replace(temporary, filename)
+    except BaseException:
+      if os.path.exists(temporary):
+        os.unlink(temporary)
+      raise
+  return os.path.getsize(filename)
+
+def render_chunk(chunk, formats, directory, width):
+  # Returns (format, size, seconds) for each output, the size being None
+  # for one that failed
+  results = []
+  for number, document in chunk:
+    for format in formats:
+      start = time.perf_counter()
+      try:
+        size = write_document(document, format, directory, width)
+      except Exception as err:
+        batch.report_failure(format + " document", number,
+                             document["name"], err)
+        size = None
+      results.append((format, size, time.perf_counter() - start))
+  return results
+
+Stats = collections.namedtuple("Stats",
+                               "count bytes seconds elapsed failures")
+
+def render_batch(documents, formats, directory, width=80, workers=None,
+                 chunksize=64, maxOpen=16):
+  os.makedirs(directory, exist_ok=True)
+  workers = workers or os.cpu_count() or 1
+  totals = collections.defaultdict(lambda: [0, 0, 0.0, 0])
+  start = time.perf_counter()
+  with concurrent.futures.ProcessPoolExecutor(
+      workers, initializer=_initialize,
+      initargs=(multiprocessing.BoundedSemaphore(maxOpen),)) as executor:
+    function = functools.partial(render_chunk, formats=formats,
+                                 directory=directory, width=width)
+    for future, _ in batch.completed(executor, function,
+        batch.named_chunks(documents, chunksize, "document", numbered=True),
+        workers * 2):
+      for format, size, seconds in future.result():
+        total = totals[format]
+        if size is None:
+          total[3] += 1
+          continue
+        total[0] += 1
+        total[1] += size
+        total[2] += seconds
+  elapsed = time.perf_counter() - start
+  return {format: Stats(count, size, seconds, elapsed, failures)
+          for format, (count, size, seconds, failures) in totals.items()}
+
+def report(stats):
+  for format, (count, size, seconds, elapsed, failures) in sorted(
+      stats.items()):
+    elapsed = elapsed or 1e-9
+    print("{}: {:,} documents, {:,} bytes in {:.2f}s ({:,.0f} documents/s, "
+          "{:.1f} MB/s, {:.2f}ms each){}".format(format, count, size,
+          elapsed, count / elapsed, size / elapsed / 1e6,
+          1000 * seconds / max(count, 1),
+          ", {:,} failed".format(failures) if failures else ""))
+
+if __name__ == '__main__':
+  main()
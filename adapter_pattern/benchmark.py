@@ -0,0 +1,109 @@
+import argparse
+import io
+import random
+import textwrap
+import time
+
+import fastwrap
+import render
+
+
+# Times paragraph wrapping with textwrap.fill(), fastwrap.fill() and the
+# memoized fastwrap.FillCache over a generated corpus in which a share of
+# the paragraphs is repeated boilerplate, checking that all three produce
+# identical output, and HTML page rendering with HtmlRenderer through an
+# HtmlWriter on a UTF-8 text file against ByteHtmlRenderer on a binary
+# one, checking that both produce the same bytes. Each timing is the best
+# of --repeat runs.
+
+WORDS = """the of and to in is that for it as was with be by on not he this
+are or his from at which but have an they you were her she there been one
+all we their has would when if so no will more can paragraph renderer
+adapter pattern document boilerplate section chapter, example. however,
+which's "quoted" words""".split()
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="benchmark fastwrap against textwrap")
+  parser.add_argument("-p", "--paragraphs", type=int, default=20000)
+  parser.add_argument("-w", "--widths", default="40,72,80")
+  parser.add_argument("-b", "--boilerplate", type=float, default=0.5,
+                      help="share of paragraphs that are repeated")
+  parser.add_argument("-r", "--repeat", type=int, default=3)
+  parser.add_argument("-k", "--kind", choices=("wrap", "html", "all"),
+                      default="all")
+  args = parser.parse_args()
+  corpus = make_corpus(args.paragraphs, args.boilerplate)
+  widths = [int(width) for width in args.widths.split(",")]
+  print("{:,} paragraphs, {:,} characters, widths {}".format(
+        len(corpus), sum(len(paragraph) for paragraph in corpus), widths))
+  if args.kind in ("wrap", "all"):
+    benchmark_wrap(corpus, widths, args.repeat)
+  if args.kind in ("html", "all"):
+    benchmark_html(corpus, args.repeat)
+
+def make_corpus(count, boilerplate, seed=0):
+  generator = random.Random(seed)
+  def paragraph():
+    return " ".join(generator.choice(WORDS)
+                    for _ in range(generator.randint(20, 200)))
+  stock = [paragraph() for _ in range(20)]
+  return [generator.choice(stock) if generator.random() < boilerplate
+          else paragraph() for _ in range(count)]
+
+def best_of(repeat, function):
+  best = float("inf")
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+def benchmark_wrap(corpus, widths, repeat):
+  for width in widths:
+    expected = [textwrap.fill(paragraph, width) for paragraph in corpus]
+    assert expected == [fastwrap.fill(paragraph, width)
+                        for paragraph in corpus]
+    cache = fastwrap.FillCache()
+    assert expected == [cache.fill(paragraph, width) for paragraph in corpus]
+    slow = best_of(repeat, lambda: [textwrap.fill(paragraph, width)
+                                    for paragraph in corpus])
+    fast = best_of(repeat, lambda: [fastwrap.fill(paragraph, width)
+                                    for paragraph in corpus])
+    def cached():
+      cache.clear()
+      for paragraph in corpus:
+        cache.fill(paragraph, width)
+    memo = best_of(repeat, cached)
+    print("width {:3}: textwrap {:.3f}s  fastwrap {:.3f}s ({:.1f}x)  "
+          "cached {:.3f}s ({:.1f}x, {:.0%} hits)".format(width, slow, fast,
+          slow / fast, memo, slow / memo, cache.stats()["ratio"]))
+
+def render_html(corpus):
+  file = io.TextIOWrapper(io.BytesIO(), encoding="utf-8")
+  render.Page("Benchmark", render.HtmlRenderer(render.HtmlWriter(file)),
+              corpus).render()
+  return file.buffer.getvalue()
+
+def render_bytes(corpus):
+  file = io.BytesIO()
+  render.Page("Benchmark", render.ByteHtmlRenderer(file), corpus).render()
+  return file.getvalue()
+
+def benchmark_html(corpus, repeat):
+  escaped = sum(1 for paragraph in corpus if render.needs_escape(paragraph))
+  for name, paragraphs in (("mixed", corpus),
+                           ("plain", [paragraph.translate(PLAIN)
+                                      for paragraph in corpus])):
+    expected = render_html(paragraphs)
+    assert expected == render_bytes(paragraphs)
+    slow = best_of(repeat, lambda: render_html(paragraphs))
+    fast = best_of(repeat, lambda: render_bytes(paragraphs))
+    print("html {}: HtmlWriter {:.3f}s  ByteHtmlRenderer {:.3f}s ({:.1f}x, "
+          "{:,} bytes, {:.0%} escaped)".format(name, slow, fast, slow / fast,
+          len(expected), escaped / len(corpus) if name == "mixed" else 0))
+
+PLAIN = str.maketrans("", "", "&<>\"'")
+
+if __name__ == '__main__':
+  main()
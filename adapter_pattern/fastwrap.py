@@ -0,0 +1,74 @@
+import collections
+import re
+import textwrap
+
+
+# textwrap.fill() splits paragraphs with a large regex so that it can
+# handle hyphens, tabs and other whitespace. Paragraphs of words separated
+# by single spaces, with no word longer than the width, are by far the
+# most common and for those a single greedy pass over str.split() gives
+# exactly the same lines. Anything else is passed on to textwrap.
+
+# Characters (and runs of spaces) that textwrap treats specially: hyphens
+# and any whitespace but the space, including non-ASCII whitespace such as
+# "\xa0", which textwrap does not split on but does strip from line ends
+SPECIAL = re.compile(r"[^\S ]|-|  ")
+
+def fill(text, width=70):
+  if (not text or width < 1 or text[0] == " " or text[-1] == " " or
+      SPECIAL.search(text)):
+    return textwrap.fill(text, width)
+  words = text.split(" ")
+  lines = []
+  start = 0
+  length = -1
+  for i, word in enumerate(words):
+    size = len(word)
+    if size > width:
+      return textwrap.fill(text, width)
+    if length + 1 + size > width:
+      lines.append(" ".join(words[start:i]))
+      start = i
+      length = size
+    else:
+      length += 1 + size
+  lines.append(" ".join(words[start:]))
+  return "\n".join(lines)
+
+class FillCache:
+  # Bounded LRU memo of fill() keyed by (paragraph, width); the key uses
+  # the paragraph itself, whose hash Python caches, so that two different
+  # paragraphs can never share an entry
+  def __init__(self, maxsize=1024):
+    self.maxsize = maxsize
+    self.cache = collections.OrderedDict()
+    self.hits = self.misses = 0
+
+  def fill(self, text, width=70):
+    key = (text, width)
+    try:
+      result = self.cache[key]
+    except KeyError:
+      self.misses += 1
+      result = self.cache[key] = fill(text, width)
+      if len(self.cache) > self.maxsize:
+        self.cache.popitem(last=False)
+    else:
+      self.hits += 1
+      self.cache.move_to_end(key)
+    return result
+
+  def clear(self):
+    self.cache.clear()
+    self.hits = self.misses = 0
+
+  def stats(self):
+    lookups = self.hits + self.misses
+    return dict(maxsize=self.maxsize, size=len(self.cache), hits=self.hits,
+                misses=self.misses,
+                ratio=self.hits / lookups if lookups else 0.0)
+
+CACHE = FillCache()
+
+def cached_fill(text, width=70):
+  return CACHE.fill(text, width)
@@ -0,0 +1,273 @@
+import collections.abc
+import copy
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+
+
+# A cache of rendered pages in front of Page.render(), e.g.,
+#
+#   cache = PageCache("/var/cache/pages")
+#   cache.render(Page(title, TextRenderer(72, file), paragraphs))
+#
+# Each page is keyed by a SHA-256 of its title and paragraphs and of its
+# renderer's type and settings(), so a renderer must have a settings()
+# method and a file attribute to be cached; pages with any other renderer
+# are simply rendered. A renderer whose binary attribute is true writes
+# bytes, any other writes text, which is stored as UTF-8. Rendered pages
+# are kept as files in the cache directory, evicted least recently used
+# first once there are more than maxBytes of them, and the most recently
+# used small ones are also kept in memory, up to memoryBytes in all.
+#
+# The paragraphs are hashed as they are read, and those of one-shot
+# sources are spooled to a temporary file for rendering, so a page is
+# never held in memory. On a miss the page is rendered to the renderer's
+# file and to the cache at once; on a hit the stored page is copied to
+# the renderer's file without rendering anything, and then the renderer's
+# after_cached_render(), if it has one, is called with the number of
+# paragraphs so it can update any state rendering would have changed.
+
+SUFFIX = ".page"
+ENCODING = "utf-8"
+SPOOL_HEADER = struct.Struct("<Q") # Each spooled paragraph's length
+
+class PageCache:
+  def __init__(self, directory, maxBytes=64 << 20, memoryBytes=8 << 20,
+               maxMemoryItem=256 << 10):
+    self.directory = directory
+    self.maxBytes = maxBytes
+    self.memoryBytes = memoryBytes
+    self.maxMemoryItem = maxMemoryItem
+    self.memory = collections.OrderedDict() # key -> bytes
+    self.memorySize = 0
+    self.disk = collections.OrderedDict() # key -> size, oldest first
+    self.diskSize = 0
+    self.memoryHits = self.diskHits = self.misses = 0
+    self.bytesSaved = 0
+    os.makedirs(directory, exist_ok=True)
+    entries = []
+    for entry in os.scandir(directory):
+      if entry.name.endswith(SUFFIX) and entry.is_file():
+        stat = entry.stat()
+        entries.append((stat.st_mtime, entry.name[:-len(SUFFIX)],
+                        stat.st_size))
+    for _, key, size in sorted(entries):
+      self.disk[key] = size
+      self.diskSize += size
+    self._evict()
+
+  def render(self, page):
+    renderer = page.renderer
+    if not (hasattr(renderer, "settings") and hasattr(renderer, "file")):
+      page.render()
+      return
+    binary = getattr(renderer, "binary", False)
+    digest = _key_digest(page.title, renderer)
+    count = 0
+    spool = None
+    if not _reiterable(page):
+      spool = tempfile.TemporaryFile(dir=self.directory)
+    try:
+      for paragraph in page.iter_paragraphs():
+        data = paragraph.encode(ENCODING, "surrogatepass")
+        _update(digest, data)
+        count += 1
+        if spool is not None:
+          spool.write(SPOOL_HEADER.pack(len(data)))
+          spool.write(data)
+      key = digest.hexdigest()
+      if self._load(key, renderer.file, binary):
+        if hasattr(renderer, "after_cached_render"):
+          renderer.after_cached_render(count)
+        return
+      self.misses += 1
+      if spool is not None:
+        # Rendered from the spool by a copy so the page is left as it was
+        page = copy.copy(page)
+        page.paragraphs = []
+        page.sources = [(0, _read_spool(spool))]
+      file = renderer.file
+      tee = _Tee(file, self._filename(key), binary, self.maxMemoryItem)
+      renderer.file = tee
+      try:
+        page.render()
+      except BaseException:
+        tee.discard()
+        raise
+      finally:
+        renderer.file = file
+      self._stored(key, *tee.close())
+    finally:
+      if spool is not None:
+        spool.close()
+
+  def _filename(self, key):
+    return os.path.join(self.directory, key + SUFFIX)
+
+  def _load(self, key, file, binary):
+    data = self.memory.get(key)
+    if data is not None:
+      self.memory.move_to_end(key)
+      if key in self.disk:
+        self.disk.move_to_end(key)
+      self.memoryHits += 1
+      self.bytesSaved += len(data)
+      file.write(data if binary else data.decode(ENCODING))
+      file.flush()
+      return True
+    if key not in self.disk:
+      return False
+    filename = self._filename(key)
+    try:
+      size = os.path.getsize(filename)
+      if size <= self.maxMemoryItem:
+        with open(filename, "rb") as cached:
+          data = cached.read()
+        file.write(data if binary else data.decode(ENCODING))
+        self._remember(key, data)
+      else: # Streamed rather than held in memory
+        with open(filename, "rb") as cached:
+          if not binary:
+            cached = io.TextIOWrapper(cached, encoding=ENCODING,
+                                      newline="")
+          shutil.copyfileobj(cached, file)
+      os.utime(filename) # Keeps the LRU order across runs
+    except FileNotFoundError: # Removed, e.g., by another process
+      self.diskSize -= self.disk.pop(key)
+      return False
+    file.flush()
+    self.disk.move_to_end(key)
+    self.diskHits += 1
+    self.bytesSaved += size
+    return True
+
+  def _stored(self, key, size, data):
+    self.diskSize += size - self.disk.pop(key, 0)
+    self.disk[key] = size
+    if data is not None:
+      self._remember(key, data)
+    self._evict()
+
+  def _remember(self, key, data):
+    if len(data) > self.maxMemoryItem:
+      return
+    self.memory[key] = data
+    self.memorySize += len(data)
+    while self.memorySize > self.memoryBytes:
+      self.memorySize -= len(self.memory.popitem(last=False)[1])
+
+  def _evict(self):
+    while self.diskSize > self.maxBytes and self.disk:
+      key, size = self.disk.popitem(last=False)
+      self.diskSize -= size
+      data = self.memory.pop(key, None)
+      if data is not None:
+        self.memorySize -= len(data)
+      try:
+        os.remove(self._filename(key))
+      except FileNotFoundError:
+        pass
+
+  def clear(self):
+    for key in list(self.disk):
+      try:
+        os.remove(self._filename(key))
+      except FileNotFoundError:
+        pass
+    self.memory.clear()
+    self.disk.clear()
+    self.memorySize = self.diskSize = 0
+    self.memoryHits = self.diskHits = self.misses = self.bytesSaved = 0
+
+  def stats(self):
+    hits = self.memoryHits + self.diskHits
+    lookups = hits + self.misses
+    return dict(memoryHits=self.memoryHits, diskHits=self.diskHits,
+                misses=self.misses, ratio=hits / lookups if lookups else 0.0,
+                bytesSaved=self.bytesSaved, entries=len(self.disk),
+                diskBytes=self.diskSize, memoryBytes=self.memorySize)
+
+  def report(self):
+    return ("{ratio:.0%} hits ({memoryHits:,} memory, {diskHits:,} disk, "
+            "{misses:,} misses), {bytesSaved:,} bytes not rendered; "
+            "{entries:,} pages, {diskBytes:,} bytes on disk".format(
+            **self.stats()))
+
+def page_key(title, paragraphs, renderer):
+  digest = _key_digest(title, renderer)
+  for paragraph in paragraphs:
+    _update(digest, paragraph.encode(ENCODING, "surrogatepass"))
+  return digest.hexdigest()
+
+def _key_digest(title, renderer):
+  digest = hashlib.sha256()
+  Class = type(renderer)
+  for part in (Class.__module__, Class.__qualname__,
+               json.dumps(renderer.settings(), sort_keys=True), title):
+    _update(digest, part.encode(ENCODING, "surrogatepass"))
+  return digest
+
+def _update(digest, data):
+  # Every part is length-prefixed so that no two different pages can
+  # feed the hash the same bytes
+  digest.update(b"%d:" % len(data))
+  digest.update(data)
+
+def _reiterable(page):
+  return all(isinstance(source, collections.abc.Sequence)
+             for _, source in page.sources)
+
+def _read_spool(spool):
+  spool.seek(0)
+  while True:
+    header = spool.read(SPOOL_HEADER.size)
+    if not header:
+      return
+    size, = SPOOL_HEADER.unpack(header)
+    yield spool.read(size).decode(ENCODING, "surrogatepass")
+
+class _Tee:
+  # The renderer's file on a miss: everything written goes to the real
+  # file and, encoded if it is text, to a temporary file that close()
+  # renames into the cache, returning its size and, if it is no more
+  # than maxMemoryItem bytes, its contents
+  def __init__(self, file, filename, binary, maxMemoryItem):
+    self.file = file
+    self.filename = filename
+    self.temporary = "{}.{}.tmp".format(filename, os.getpid())
+    self.cached = open(self.temporary, "wb")
+    self.binary = binary
+    self.maxMemoryItem = maxMemoryItem
+    self.kept = []
+    self.size = 0
+
+  def write(self, data):
+    self.file.write(data)
+    chunk = data if self.binary else data.encode(ENCODING)
+    self.cached.write(chunk)
+    self.size += len(chunk)
+    if self.kept is not None:
+      if self.size <= self.maxMemoryItem:
+        self.kept.append(chunk)
+      else:
+        self.kept = None
+    return len(data)
+
+  def flush(self):
+    self.file.flush()
+
+  def close(self):
+    self.cached.close()
+    os.replace(self.temporary, self.filename)
+    return self.size, None if self.kept is None else b"".join(self.kept)
+
+  def discard(self):
+    self.cached.close()
+    try:
+      os.remove(self.temporary)
+    except FileNotFoundError:
+      pass
@@ -1,7 +1,13 @@
 import abc
+import collections
+import concurrent.futures
+import functools
+import io
+import itertools
+import os
 import sys
-import textwrap
 from html import escape
+import fastwrap
 import Qtrac
 
 @Qtrac.has_methods("header", "paragraph", "footer")
@@ -38,22 +44,115 @@ def main():
 
 
 class Page:
-  def __init__(self, title, renderer):
+  # Besides the paragraphs stored one at a time by add_paragraph(), a page
+  # can have any number of sources of paragraphs, each a list or any other
+  # iterable, e.g., a generator or read_paragraphs(), rendered where they
+  # were added among the stored ones. Sources are only pulled when the
+  # page is rendered, one paragraph at a time, so one-shot sources such as
+  # generators can only be rendered once
+  def __init__(self, title, renderer, paragraphs=None):
     if not isinstance(renderer, Renderer):
       raise TypeError("Expected object of type Renderer, got {}".format(type(renderer).__name__))
     self.title = title
     self.renderer = renderer
     self.paragraphs = []
+    self.sources = [] # (number of paragraphs stored before it, iterable)
+    if paragraphs is not None:
+      self.add_paragraphs(paragraphs)
 
   def add_paragraph(self, paragraph):
     self.paragraphs.append(paragraph)
 
+  def add_paragraphs(self, paragraphs):
+    self.sources.append((len(self.paragraphs), paragraphs))
+
+  def iter_paragraphs(self):
+    if not self.sources:
+      return iter(self.paragraphs)
+    return self._iter_sources()
+
+  def _iter_sources(self):
+    start = 0
+    for end, source in self.sources:
+      yield from self.paragraphs[start:end]
+      yield from source
+      start = end
+    yield from self.paragraphs[start:]
+
+  @Qtrac.timed("Page.render")
   def render(self):
     self.renderer.header(self.title)
-    for paragraph in self.paragraphs:
+    for paragraph in self.iter_paragraphs():
       self.renderer.paragraph(paragraph)
     self.renderer.footer()
 
+  @Qtrac.coroutine
+  def sink(self):
+    # A pipeline stage (see pipeline.py) that renders the page's own
+    # paragraphs and then each paragraph sent to it; closing it finishes
+    # the page
+    self.renderer.header(self.title)
+    for paragraph in self.iter_paragraphs():
+      self.renderer.paragraph(paragraph)
+    try:
+      while True:
+        self.renderer.paragraph((yield))
+    except GeneratorExit:
+      self.renderer.footer()
+
+  def render_parallel(self, executor=None, workers=None, chunksize=256):
+    # Renderers that can split paragraph() into a picklable pure
+    # formatter() and write_paragraph() have their paragraphs formatted in
+    # chunks in a process pool; the chunks are written in their original
+    # order as they come back, with at most two per worker in flight, so
+    # the output is identical to render()'s. A renderer whose formatter()
+    # returns None is rendered by render()
+    formatter = None
+    if (hasattr(self.renderer, "formatter") and
+        hasattr(self.renderer, "write_paragraph")):
+      formatter = self.renderer.formatter()
+    if formatter is None:
+      self.render()
+      return
+    workers = workers or os.cpu_count() or 1
+    ownExecutor = executor is None
+    if ownExecutor:
+      executor = concurrent.futures.ProcessPoolExecutor(workers)
+    try:
+      paragraphs = self.iter_paragraphs()
+      pending = collections.deque()
+      self.renderer.header(self.title)
+      while True:
+        chunk = list(itertools.islice(paragraphs, chunksize))
+        if chunk:
+          pending.append(executor.submit(_format_chunk, formatter, chunk))
+        if pending and (not chunk or len(pending) >= workers * 2):
+          for formatted in pending.popleft().result():
+            self.renderer.write_paragraph(formatted)
+        elif not chunk:
+          break
+      self.renderer.footer()
+    finally:
+      if ownExecutor:
+        executor.shutdown()
+
+def _format_chunk(formatter, chunk):
+  return [formatter(paragraph) for paragraph in chunk]
+
+def read_paragraphs(filenameOrFile, encoding="utf-8"):
+  # Yields each non-blank line of the file as a paragraph
+  file = None if isinstance(filenameOrFile, str) else filenameOrFile
+  try:
+    if file is None:
+      file = open(filenameOrFile, encoding=encoding)
+    for line in file:
+      line = line.rstrip("\r\n")
+      if line.strip():
+        yield line
+  finally:
+    if isinstance(filenameOrFile, str) and file:
+      file.close()
+
 class TextRenderer:
   def __init__(self, width=80, file=sys.stdout):
     self.width = width
@@ -65,14 +164,32 @@ class TextRenderer:
                 "=" * len(title), self.width))
 
   def paragraph(self, text):
+    self.write_paragraph(fastwrap.cached_fill(text, self.width))
+
+  def settings(self):
+    # Everything besides the page that affects what is written
+    return dict(width=self.width, previous=self.previous)
+
+  def after_cached_render(self, count):
+    # Called by PageCache after writing a stored page of count paragraphs
+    if count:
+      self.previous = True
+
+  def formatter(self):
+    # cached_fill() only matches what paragraph() itself writes
+    if type(self).paragraph is not TextRenderer.paragraph:
+      return None
+    return functools.partial(fastwrap.cached_fill, width=self.width)
+
+  def write_paragraph(self, formatted):
     if self.previous:
       self.file.write("\n")
-    self.file.write(textwrap.fill(text, self.width))
+    self.file.write(formatted)
     self.file.write("\n")
     self.previous = True
 
   def footer(self):
-    pass
+    self.file.flush()
 
 class HtmlWriter:
   def __init__(self, file=sys.stdout):
@@ -95,11 +212,26 @@ class HtmlWriter:
 
   def footer(self):
     self.file.write("</html>\n")
+    self.file.flush()
 
 class HtmlRenderer:
   def __init__(self, htmlWriter):
     self.htmlWriter = htmlWriter
 
+  @property
+  def file(self):
+    return self.htmlWriter.file
+
+  @file.setter
+  def file(self, file):
+    self.htmlWriter.file = file
+
+  def settings(self):
+    # The writer decides what is written, so an HtmlWriter subclass must
+    # not share cached pages with HtmlWriter itself
+    Writer = type(self.htmlWriter)
+    return dict(writer="{}.{}".format(Writer.__module__, Writer.__qualname__))
+
   def header(self, title):
     self.htmlWriter.header()
     self.htmlWriter.title(title)
@@ -109,8 +241,153 @@ class HtmlRenderer:
     self.htmlWriter.body(text)
     self.htmlWriter.end_body()
 
+  def formatter(self):
+    # html_paragraph() only matches what HtmlWriter itself writes
+    if type(self.htmlWriter) is not HtmlWriter:
+      return None
+    return html_paragraph
+
+  def write_paragraph(self, formatted):
+    self.htmlWriter.file.write(formatted)
+
   def footer(self):
     self.htmlWriter.footer()
 
+def html_paragraph(text):
+  # What HtmlRenderer.paragraph() writes through an HtmlWriter
+  return "<body>\n<p>{}</p>\n</body>\n".format(escape(text))
+
+class ByteHtmlRenderer:
+  # Writes exactly what HtmlRenderer does through an HtmlWriter, but as
+  # UTF-8 bytes straight to a binary file (sys.stdout.buffer by default).
+  # The markup is precompiled into byte chunks and paragraphs are collected
+  # until limit characters are pending; then they are joined with a NUL,
+  # escaped only if some of them need it, and encoded and written in one
+  # go, with each NUL replaced by the markup between two paragraphs
+  HEADER = b"<!doctype html>\n<html>\n<head><title>"
+  TITLE_END = b"</title></head>\n"
+  PARAGRAPH_START = b"<body>\n<p>"
+  PARAGRAPH_END = b"</p>\n</body>\n"
+  BETWEEN = "</p>\n</body>\n<body>\n<p>"
+  FOOTER = b"</html>\n"
+  binary = True
+
+  def __init__(self, file=None, limit=1 << 16):
+    self.file = file if file is not None else sys.stdout.buffer
+    self.limit = limit
+    self.pending = []
+    self.size = 0
+
+  def header(self, title):
+    self.file.write(b"".join((self.HEADER, html_bytes(title),
+                              self.TITLE_END)))
+
+  def paragraph(self, text):
+    self.pending.append(text)
+    self.size += len(text)
+    if self.size >= self.limit:
+      self.flush()
+
+  def settings(self):
+    return {}
+
+  def formatter(self):
+    # html_paragraph_bytes() only matches what paragraph() itself writes
+    if type(self).paragraph is not ByteHtmlRenderer.paragraph:
+      return None
+    return html_paragraph_bytes
+
+  def write_paragraph(self, formatted):
+    if self.pending:
+      self.flush()
+    self.file.write(formatted)
+
+  def flush(self):
+    pending = self.pending
+    self.pending = []
+    self.size = 0
+    if not pending:
+      return
+    batch = "\0".join(pending)
+    if batch.count("\0") != len(pending) - 1: # A paragraph holds a NUL
+      self.file.write(b"".join(map(html_paragraph_bytes, pending)))
+      return
+    if needs_escape(batch):
+      batch = escape(batch)
+    self.file.write(b"".join((self.PARAGRAPH_START,
+                              batch.replace("\0", self.BETWEEN).encode(
+                              "utf-8"), self.PARAGRAPH_END)))
+
+  def footer(self):
+    self.flush()
+    self.file.write(self.FOOTER)
+    self.file.flush()
+
+def needs_escape(text):
+  # Much faster than a regex character class: each test is a memchr()
+  return ("&" in text or "<" in text or ">" in text or '"' in text or
+          "'" in text)
+
+def html_bytes(text):
+  if needs_escape(text):
+    text = escape(text)
+  return text.encode("utf-8")
+
+def html_paragraph_bytes(text):
+  # What ByteHtmlRenderer.paragraph() writes
+  return b"".join((ByteHtmlRenderer.PARAGRAPH_START, html_bytes(text),
+                   ByteHtmlRenderer.PARAGRAPH_END))
+
+class BufferedSink:
+  # A file-like output sink for TextRenderer and HtmlWriter that collects
+  # written fragments and passes them on to the file in a single call once
+  # limit characters are pending: writelines() for text files, one encoded
+  # write for binary ones such as pipes and sockets
+  def __init__(self, file=sys.stdout, limit=1 << 16, encoding="utf-8"):
+    self.file = file
+    self.limit = limit
+    self.encoding = encoding
+    self.binary = not isinstance(file, io.TextIOBase)
+    self.pending = []
+    self.size = 0
+    self.bytes = 0 # Characters for text files
+    self.writes = 0
+    self.flushes = 0
+
+  def write(self, text):
+    self.pending.append(text)
+    self.size += len(text)
+    self.writes += 1
+    if self.size >= self.limit:
+      self._drain()
+    return len(text)
+
+  def _drain(self):
+    if not self.pending:
+      return
+    if self.binary:
+      data = "".join(self.pending).encode(self.encoding)
+      self.file.write(data)
+      self.bytes += len(data)
+    else:
+      self.file.writelines(self.pending)
+      self.bytes += self.size
+    self.pending = []
+    self.size = 0
+    self.flushes += 1
+
+  def flush(self):
+    self._drain()
+    self.file.flush()
+
+  def close(self):
+    self.flush()
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *exc_info):
+    self.close()
+
 if __name__ == '__main__':
   main()
\ No newline at end of file
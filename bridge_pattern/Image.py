@@ -0,0 +1,358 @@
+import array
+import os
+import queue
+import struct
+import sys
+import threading
+import zlib
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+
+# A raster image held as one flat row-major sequence of 32-bit ARGB
+# pixels: a numpy array if numpy is installed, otherwise an array('I').
+# An image can also be laid over an existing writable buffer of at least
+# width * height * 4 bytes, e.g., shared memory, instead of its own.
+# Rectangles are filled a whole row span at a time (one slice assignment
+# for the whole rectangle with numpy), never a pixel at a time.
+#
+# save() writes XPM, PPM, PGM or PNG, chosen by the filename's extension.
+# The binary formats are written a band of rows at a time straight from
+# the pixel buffer's bytes, with the channels picked out by extended
+# slices rather than pixel by pixel.
+
+TRANSPARENT = 0x00000000
+
+COLORS = {"black": 0xFF000000, "white": 0xFFFFFFFF, "red": 0xFFFF0000,
+          "green": 0xFF008000, "lime": 0xFF00FF00, "blue": 0xFF0000FF,
+          "yellow": 0xFFFFFF00, "magenta": 0xFFFF00FF, "cyan": 0xFF00FFFF,
+          "gray": 0xFF808080, "grey": 0xFF808080, "silver": 0xFFC0C0C0,
+          "maroon": 0xFF800000, "olive": 0xFF808000, "navy": 0xFF000080,
+          "purple": 0xFF800080, "teal": 0xFF008080, "orange": 0xFFFFA500,
+          "pink": 0xFFFFC0CB, "brown": 0xFFA52A2A,
+          "transparent": TRANSPARENT}
+
+def color_for_name(name):
+  # A color name from COLORS or #RGB or #RRGGBB
+  try:
+    return COLORS[name.lower()]
+  except KeyError:
+    pass
+  if name.startswith("#") and len(name) in (4, 7):
+    digits = name[1:] if len(name) == 7 else "".join(c * 2 for c in name[1:])
+    try:
+      return 0xFF000000 | int(digits, 16)
+    except ValueError:
+      pass
+  raise ValueError("invalid color name {!r}".format(name))
+
+class Image:
+
+  def __init__(self, width, height, background=TRANSPARENT, buffer=None):
+    if width < 0 or height < 0:
+      raise ValueError("invalid image size {}x{}".format(width, height))
+    self.width = width
+    self.height = height
+    count = width * height
+    if buffer is not None:
+      if numpy is not None:
+        self.pixels = numpy.frombuffer(buffer, dtype=numpy.uint32,
+                                       count=count)
+      else:
+        self.pixels = memoryview(buffer).cast("B")[:count * 4].cast("I")
+      if background is not None:
+        self.clear(background)
+    elif numpy is not None:
+      self.pixels = numpy.full(count, background or TRANSPARENT,
+                               dtype=numpy.uint32)
+    else:
+      self.pixels = array.array("I", [background or TRANSPARENT]) * count
+
+  @property
+  def size(self):
+    return self.width, self.height
+
+  def clear(self, color=TRANSPARENT):
+    self.rectangle(0, 0, self.width - 1, self.height - 1, fill=color)
+
+  def pixel(self, x, y):
+    return int(self.pixels[y * self.width + x])
+
+  def rectangle(self, x0, y0, x1, y1, fill=None):
+    # The corners are inclusive and the rectangle is clipped to the image
+    if fill is None:
+      return
+    x0, x1 = max(min(x0, x1), 0), min(max(x0, x1), self.width - 1)
+    y0, y1 = max(min(y0, y1), 0), min(max(y0, y1), self.height - 1)
+    if x0 > x1 or y0 > y1:
+      return
+    if numpy is not None and isinstance(self.pixels, numpy.ndarray):
+      self.pixels.reshape(self.height, self.width)[y0:y1 + 1,
+                                                   x0:x1 + 1] = fill
+      return
+    span = x1 - x0 + 1
+    row = array.array("I", [fill]) * span
+    if span == self.width: # Whole rows are one contiguous slice
+      self.pixels[y0 * self.width:(y1 + 1) * self.width] = row * (
+        y1 - y0 + 1)
+      return
+    for start in range(y0 * self.width + x0, y1 * self.width + x0 + 1,
+                       self.width):
+      self.pixels[start:start + span] = row
+
+  def bars(self, x, tops, colors, barWidth, step, background):
+    # Redraws the strip of columns from x to x + len(tops) * step (or the
+    # right edge) top to bottom: bar i is barWidth columns wide, starts
+    # at column x + i * step and is colors[i] from row tops[i] down, and
+    # the rest of the strip is background. Each band of rows in which no
+    # bar starts is written with one slice assignment per row (one in all
+    # for a full-width strip), or with numpy the strip is one where()
+    if barWidth > step:
+      raise ValueError("bars of width {} overlap at step {}".format(
+                       barWidth, step))
+    columns = min(len(tops) * step, self.width - x)
+    if columns <= 0 or not self.height:
+      return
+    height = self.height
+    if numpy is not None and isinstance(self.pixels, numpy.ndarray):
+      count = len(tops)
+      columnTops = numpy.full((count, step), height, dtype=numpy.int64)
+      columnTops[:, :barWidth] = numpy.clip(numpy.asarray(tops), 0,
+                                            height)[:, None]
+      columnColors = numpy.zeros((count, step), dtype=numpy.uint32)
+      columnColors[:, :barWidth] = numpy.asarray(colors,
+                                                 dtype=numpy.uint32)[:, None]
+      rows = numpy.arange(height)[:, None]
+      self.pixels.reshape(height, self.width)[:, x:x + columns] = (
+        numpy.where(rows >= columnTops.reshape(-1)[:columns],
+                    columnColors.reshape(-1)[:columns], background))
+      return
+    segment = array.array("I", [background]) * columns
+    runs = {}
+    y = 0
+    for top, i in sorted((max(top, 0), i) for i, top in enumerate(tops)):
+      if top >= height:
+        break
+      self._fill_rows(x, y, top, segment)
+      y = top
+      start = i * step
+      span = min(barWidth, columns - start)
+      if span > 0:
+        run = runs.get(colors[i])
+        if run is None:
+          run = runs[colors[i]] = array.array("I", [colors[i]]) * barWidth
+        segment[start:start + span] = run[:span] if span < barWidth else run
+    self._fill_rows(x, y, height, segment)
+
+  def _fill_rows(self, x, y0, y1, segment):
+    # Writes segment at column x of rows y0 to y1 - 1
+    if y0 >= y1:
+      return
+    if x == 0 and len(segment) == self.width:
+      self.pixels[y0 * self.width:y1 * self.width] = segment * (y1 - y0)
+      return
+    for start in range(y0 * self.width + x, y1 * self.width, self.width):
+      self.pixels[start:start + len(segment)] = segment
+
+  def rows(self):
+    # Yields each row of pixels as a slice of the pixels
+    for start in range(0, self.width * self.height, self.width):
+      yield self.pixels[start:start + self.width]
+
+  def colors(self):
+    if numpy is not None and isinstance(self.pixels, numpy.ndarray):
+      return [int(color) for color in numpy.unique(self.pixels)]
+    return sorted(set(self.pixels))
+
+  def save(self, filename, threaded=False):
+    # threaded only affects PNGs, which are then compressed in a worker
+    # thread while the main thread prepares the rows
+    extension = os.path.splitext(filename)[1].lower()
+    if extension not in FORMATS:
+      raise ValueError("cannot save {}: the extension must be one of {}"
+                       .format(filename, ", ".join(FORMATS)))
+    with open(filename, "wb") as file:
+      if extension == ".xpm":
+        for chunk in self._xpm_chunks(filename):
+          file.write(chunk)
+      elif extension == ".ppm":
+        self._write_ppm(file)
+      elif extension == ".pgm":
+        self._write_pgm(file)
+      else:
+        self._write_png(file, threaded)
+
+  def _bands(self, bytesPerPixel=4):
+    # Yields (first row, row after last) for bands of about a megabyte
+    rows = max(1, (1 << 20) // max(self.width * bytesPerPixel, 1))
+    for top in range(0, self.height, rows):
+      yield top, min(top + rows, self.height)
+
+  def _channels(self, top, bottom, channels):
+    # Returns the pixels of rows top to bottom - 1 as a bytearray of the
+    # given channels (offsets into each pixel's bytes), interleaved
+    raw = memoryview(self.pixels).cast("B")[top * self.width * 4:
+                                            bottom * self.width * 4]
+    count = len(channels)
+    data = bytearray(len(raw) // 4 * count)
+    for i, channel in enumerate(channels):
+      data[i::count] = raw[channel::4]
+    return data
+
+  def _write_ppm(self, file):
+    file.write("P6\n{} {}\n255\n".format(self.width, self.height).encode(
+               "ascii"))
+    for top, bottom in self._bands():
+      file.write(self._channels(top, bottom, (RED, GREEN, BLUE)))
+
+  def _write_pgm(self, file):
+    # Luma per ITU-R BT.601; rows the same as the one above are reused
+    file.write("P5\n{} {}\n255\n".format(self.width, self.height).encode(
+               "ascii"))
+    grays = {}
+    def gray(color):
+      value = grays[color] = ((color >> 16 & 0xFF) * 299 +
+                              (color >> 8 & 0xFF) * 587 +
+                              (color & 0xFF) * 114 + 500) // 1000
+      return value
+    previous = line = None
+    for top, bottom in self._bands(1):
+      lines = []
+      for y in range(top, bottom):
+        row = self.pixels[y * self.width:(y + 1) * self.width]
+        data = row.tobytes()
+        if data != previous:
+          line = bytes([grays[color] if color in grays else gray(color)
+                        for color in row.tolist()])
+          previous = data
+        lines.append(line)
+      file.write(b"".join(lines))
+
+  def _write_png(self, file, threaded=False, level=6):
+    # 8-bit RGBA. A row the same as the one above uses filter type 2
+    # (up), so it is all zeros and compresses to almost nothing; any
+    # other row is unfiltered and only those rows have their channels
+    # reordered. Rows are compressed a band at a time
+    stride = self.width * 4
+    file.write(PNG_SIGNATURE)
+    _write_png_chunk(file, b"IHDR", struct.pack(">IIBBBBB", self.width,
+                     self.height, 8, 6, 0, 0, 0))
+    repeated = b"\x02" + bytes(stride)
+    raw = memoryview(self.pixels).cast("B")
+    def bands():
+      previous = None
+      for top, bottom in self._bands():
+        parts = []
+        for y in range(top, bottom):
+          row = raw[y * stride:(y + 1) * stride].tobytes()
+          if row == previous:
+            parts.append(repeated)
+          else:
+            parts.append(b"\x00")
+            parts.append(self._channels(y, y + 1, (RED, GREEN, BLUE,
+                                                   ALPHA)))
+            previous = row
+        yield b"".join(parts)
+    compressor = zlib.compressobj(level)
+    if threaded:
+      _compress_threaded(file, compressor, bands())
+    else:
+      for band in bands():
+        _write_png_data(file, compressor.compress(band))
+    _write_png_data(file, compressor.flush())
+    _write_png_chunk(file, b"IEND", b"")
+
+  def _xpm_chunks(self, filename):
+    colors = self.colors()
+    perPixel = 1
+    while len(XPM_CHARS) ** perPixel < len(colors):
+      perPixel += 1
+    codes = {}
+    for i, color in enumerate(colors):
+      code = ""
+      for _ in range(perPixel):
+        i, digit = divmod(i, len(XPM_CHARS))
+        code += XPM_CHARS[digit]
+      codes[color] = code.encode("ascii")
+    name = "".join(c if c.isalnum() else "_" for c in
+                   filename.replace("\\", "/").rsplit("/", 1)[-1][:-4])
+    yield ('/* XPM */\nstatic char *{}[] = {{\n"{} {} {} {}",\n'.format(
+           name or "image", self.width, self.height, len(colors),
+           perPixel).encode("ascii"))
+    yield b"".join(b'"' + codes[color] + b" c " + (b"None" if not
+                   color >> 24 else "#{:06X}".format(color & 0xFFFFFF
+                   ).encode("ascii")) + b'",\n' for color in colors)
+    # A band of rows at a time keeps the pieces large and few; a row that
+    # is the same as the one above it, as most are in charts, is not
+    # encoded again
+    lookup = codes.__getitem__
+    separator = b'",\n"'
+    band = max(1, (1 << 20) // max(self.width * perPixel, 1))
+    rows = self.rows()
+    last = self.height - 1
+    previous = line = None
+    for top in range(0, self.height, band):
+      lines = []
+      for _, row in zip(range(band), rows):
+        data = row.tobytes()
+        if data != previous:
+          line = b"".join(map(lookup, row.tolist()))
+          previous = data
+        lines.append(line)
+      yield (b'"' + separator.join(lines) +
+             (b'"\n' if top + band > last else b'",\n'))
+    yield b"};\n"
+
+# The characters used for pixels in XPM files: printable ASCII except " \
+XPM_CHARS = "".join(chr(c) for c in range(32, 127) if chr(c) not in '"\\')
+
+FORMATS = (".xpm", ".ppm", ".pgm", ".png")
+
+# The offsets of each channel in the bytes of an ARGB pixel
+if sys.byteorder == "little":
+  BLUE, GREEN, RED, ALPHA = 0, 1, 2, 3
+else:
+  ALPHA, RED, GREEN, BLUE = 0, 1, 2, 3
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+
+def _write_png_chunk(file, kind, data):
+  file.write(struct.pack(">I", len(data)))
+  file.write(kind)
+  file.write(data)
+  file.write(struct.pack(">I", zlib.crc32(data, zlib.crc32(kind))))
+
+def _write_png_data(file, data):
+  if data:
+    _write_png_chunk(file, b"IDAT", data)
+
+def _compress_threaded(file, compressor, bands):
+  # zlib releases the GIL so compression overlaps with preparing the next
+  # band; if the worker fails it keeps draining the queue so the main
+  # thread never blocks, and its exception is raised here
+  pending = queue.Queue(maxsize=4)
+  errors = []
+  def compress():
+    while True:
+      band = pending.get()
+      if band is None:
+        return
+      if not errors:
+        try:
+          _write_png_data(file, compressor.compress(band))
+        except BaseException as err:
+          errors.append(err)
+  worker = threading.Thread(target=compress, daemon=True)
+  worker.start()
+  try:
+    for band in bands:
+      if errors:
+        break
+      pending.put(band)
+  finally:
+    pending.put(None)
+    worker.join()
+  if errors:
+    raise errors[0]
@@ -10,11 +10,14 @@
 # General Public License for more details.
 
 import abc
+import atexit
 import collections
 import errno
 import functools
+import json
 import os
 import sys
+import time
 
 
 def coroutine(function):
@@ -96,3 +99,135 @@ def report(message="", error=False):
         message = message[:67] + "..."
     sys.stdout.write("\r{:70}{}".format(message, "\n" if error else ""))
     sys.stdout.flush()
+
+
+# Instrumentation: counters, timers and a progress reporter. Everything is
+# off until enable() is called and while off each call does no more than
+# check a flag; timed() works as a context manager or as a decorator, and
+# instrument() wraps methods of existing classes, e.g.,
+#   Qtrac.enable("stats.json")
+#   Qtrac.instrument(TextRenderer, "paragraph")
+class Instruments:
+
+    def __init__(self):
+        self.enabled = False
+        self.counters = collections.Counter()
+        self.timers = {} # name -> [calls, total seconds, maximum seconds]
+        self.summaryFilename = None
+
+    def record(self, name, seconds):
+        timer = self.timers.get(name)
+        if timer is None:
+            self.timers[name] = [1, seconds, seconds]
+        else:
+            timer[0] += 1
+            timer[1] += seconds
+            if seconds > timer[2]:
+                timer[2] = seconds
+
+    def summary(self):
+        return dict(counters=dict(self.counters),
+                timers={name: dict(calls=calls, total=total,
+                                   mean=total / calls, maximum=maximum)
+                        for name, (calls, total, maximum) in
+                        self.timers.items()})
+
+    def dump(self, filename=None):
+        filename = filename or self.summaryFilename
+        if filename:
+            with open(filename, "w", encoding="utf-8") as file:
+                json.dump(self.summary(), file, indent=2, sort_keys=True)
+
+
+instruments = Instruments()
+
+
+def enable(summaryFilename=None):
+    instruments.enabled = True
+    if summaryFilename is not None:
+        if instruments.summaryFilename is None:
+            atexit.register(instruments.dump)
+        instruments.summaryFilename = summaryFilename
+
+
+def disable():
+    instruments.enabled = False
+
+
+def count(name, amount=1):
+    if instruments.enabled:
+        instruments.counters[name] += amount
+
+
+class timed:
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter() if instruments.enabled else None
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.start is not None:
+            instruments.record(self.name, time.perf_counter() - self.start)
+
+    def __call__(self, function):
+        name = self.name
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not instruments.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                instruments.record(name, time.perf_counter() - start)
+        return wrapper
+
+
+def instrument(Class, *methods):
+    for method in methods:
+        setattr(Class, method, timed("{}.{}".format(Class.__name__,
+                method))(getattr(Class, method)))
+
+
+class Progress:
+
+    # Reports items/s, bytes/s and, given a total, the ETA through
+    # report() at most once every interval seconds
+    def __init__(self, total=None, interval=0.5, label=""):
+        self.total = total
+        self.interval = interval
+        self.label = label
+        self.items = 0
+        self.bytes = 0
+        self.start = self.last = time.perf_counter()
+
+    def update(self, items=1, nbytes=0):
+        if not instruments.enabled:
+            return
+        self.items += items
+        self.bytes += nbytes
+        now = time.perf_counter()
+        if now - self.last >= self.interval:
+            self.last = now
+            report(self.message(now))
+
+    def message(self, now=None):
+        elapsed = max((now or time.perf_counter()) - self.start, 1e-9)
+        rate = self.items / elapsed
+        parts = [self.label, "{:,} items {:,.0f}/s".format(self.items, rate)]
+        if self.bytes:
+            parts.append("{:,.1f} MB/s".format(self.bytes / elapsed / 1e6))
+        if self.total and rate:
+            eta = int(max(self.total - self.items, 0) / rate)
+            parts.append("ETA {}:{:02}:{:02}".format(eta // 3600,
+                         eta // 60 % 60, eta % 60))
+        return " ".join(part for part in parts if part)
+
+    def done(self):
+        if instruments.enabled:
+            report(self.message())
+            sys.stdout.write("\n")
+            count(self.label or "items", self.items)
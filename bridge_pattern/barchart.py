@@ -1,7 +1,10 @@
 import abc
+import itertools
 import os
 import re
+import sys
 import tempfile
+import time
 import Qtrac
 try:
   import cyImage as Image
@@ -18,8 +21,13 @@ def main():
   imageBarCharter.render("Forecast 6/8", pairs)
 
 class BarRenderer(Qtrac.Requirer):
+  # Renderers may also have a draw_bars(names, values) method that draws
+  # many bars at once, which BarCharter.render() then uses instead of
+  # draw_bar()
   required_methods = {"initialize", "draw_caption", "draw_bar", "finalize"}
 
+BATCH_SIZE = 1 << 16
+
 class BarCharter:
 
   def __init__(self, renderer):
@@ -28,19 +36,143 @@ class BarCharter:
                       format(type(renderer).__name__))
     self.__renderer = renderer
 
-  def render(self, caption, pairs):
-    maximum = max(value for _, value in pairs)
-    self.__renderer.initialize(len(pairs), maximum)
+  @Qtrac.timed("BarCharter.render")
+  def render(self, caption, pairs, maximum=None, count=None,
+             aggregate="max"):
+    # pairs may be a sequence or a one-shot iterable of (name, value)
+    # pairs. If the number of pairs is known (count or len(pairs)) and is
+    # within the renderer's maxBars they are drawn as they come, and if
+    # the maximum is known too nothing is held in memory; otherwise they
+    # are downsampled to at most maxBars bars of aggregated values
+    limit = getattr(self.__renderer, "maxBars", None)
+    if count is None and hasattr(pairs, "__len__"):
+      count = len(pairs)
+    if count is not None and (limit is None or count <= limit):
+      if maximum is None:
+        if iter(pairs) is pairs:
+          pairs = list(pairs)
+        maximum = max(value for _, value in pairs)
+    elif limit is None:
+      pairs = list(pairs)
+      count = len(pairs)
+      if maximum is None:
+        maximum = max(value for _, value in pairs)
+    else:
+      downsampler = Downsampler(limit, aggregate)
+      for name, value in pairs:
+        downsampler.add(name, value)
+      pairs = list(downsampler.bars())
+      count = len(pairs)
+      maximum = max(value for _, value in pairs)
+    self.__renderer.initialize(count, maximum)
     self.__renderer.draw_caption(caption)
-    for name, value in pairs:
-      self.__renderer.draw_bar(name, value)
+    if hasattr(self.__renderer, "draw_bars"):
+      # Batches bound the memory used when pairs is a one-shot iterator
+      pairs = iter(pairs)
+      while True:
+        batch = list(itertools.islice(pairs, BATCH_SIZE))
+        if not batch:
+          break
+        names, values = zip(*batch)
+        self.__renderer.draw_bars(names, values)
+    else:
+      for name, value in pairs:
+        self.__renderer.draw_bar(name, value)
     self.__renderer.finalize()
 
+  @Qtrac.coroutine
+  def sink(self, caption, bars, maximum):
+    # A pipeline stage (see pipeline.py) that draws each (name, value)
+    # pair sent to it; the number of bars and the maximum value must be
+    # known in advance. Closing it finishes the chart
+    self.__renderer.initialize(bars, maximum)
+    self.__renderer.draw_caption(caption)
+    try:
+      while True:
+        name, value = (yield)
+        self.__renderer.draw_bar(name, value)
+    except GeneratorExit:
+      self.__renderer.finalize()
+
+
+class Downsampler:
+
+  # Aggregates a series of any length into at most limit buckets of
+  # consecutive (name, value) pairs, online and in O(limit) memory: each
+  # bucket holds up to span pairs and whenever there are more than twice
+  # limit buckets adjacent ones are merged and span doubles. bars() then
+  # combines runs of one or two buckets so that a series of at least
+  # limit pairs always gives exactly limit bars
+  AGGREGATES = {"min", "max", "mean"}
+
+  def __init__(self, limit, aggregate="max"):
+    if aggregate not in Downsampler.AGGREGATES:
+      raise ValueError("unknown aggregate {!r}".format(aggregate))
+    self.limit = max(1, limit)
+    self.aggregate = aggregate
+    self.span = 1
+    self.count = 0
+    self.buckets = [] # [first name, last name, count, min, max, total]
+
+  def add(self, name, value):
+    self.count += 1
+    if self.buckets and self.buckets[-1][2] < self.span:
+      bucket = self.buckets[-1]
+      bucket[1] = name
+      bucket[2] += 1
+      if value < bucket[3]:
+        bucket[3] = value
+      if value > bucket[4]:
+        bucket[4] = value
+      bucket[5] += value
+    else:
+      self.buckets.append([name, name, 1, value, value, value])
+      if len(self.buckets) > 2 * self.limit:
+        self._merge()
+
+  def _merge(self):
+    buckets = []
+    for i in range(0, len(self.buckets) - 1, 2):
+      first, second = self.buckets[i], self.buckets[i + 1]
+      buckets.append([first[0], second[1], first[2] + second[2],
+                      min(first[3], second[3]), max(first[4], second[4]),
+                      first[5] + second[5]])
+    if len(self.buckets) % 2:
+      buckets.append(self.buckets[-1])
+    self.buckets = buckets
+    self.span *= 2
+
+  def bars(self):
+    # Yields a (name, value) pair per bar; a bar of several pairs is named
+    # after its first and last
+    buckets = self.buckets
+    if len(buckets) > self.limit:
+      buckets = [_combined(buckets[i * len(buckets) // self.limit:
+                                   (i + 1) * len(buckets) // self.limit])
+                 for i in range(self.limit)]
+    for first, last, count, minimum, maximum, total in buckets:
+      name = first if count == 1 else "{}..{}".format(first, last)
+      if self.aggregate == "max":
+        yield name, maximum
+      elif self.aggregate == "min":
+        yield name, minimum
+      else:
+        yield name, total / count
+
+
+def _combined(buckets):
+  return [buckets[0][0], buckets[-1][1],
+          sum(bucket[2] for bucket in buckets),
+          min(bucket[3] for bucket in buckets),
+          max(bucket[4] for bucket in buckets),
+          sum(bucket[5] for bucket in buckets)]
+
 
 class TextBarRenderer:
 
-  def __init__(self, scaleFactor=40):
+  def __init__(self, scaleFactor=40, maxBars=None):
     self.scaleFactor = scaleFactor
+    self.maxBars = maxBars
 
   def initialize(self, bars, maximum):
     assert bars > 0 and maximum > 0
@@ -53,29 +185,134 @@ class TextBarRenderer:
   def draw_bar(self, name, value):
     print("{} {}".format("*" * int(value * self.scale), name))
 
+  def draw_bars(self, names, values):
+    scale = self.scale
+    print("\n".join(["{} {}".format("*" * int(value * scale), name)
+                     for name, value in zip(names, values)]))
+
   def finalize(self):
     pass
 
 
+class LiveTextBarRenderer(TextBarRenderer):
+
+  # Redraws the same chart in place on an ANSI terminal, e.g., for a
+  # dashboard that calls BarCharter.render() on every refresh. The first
+  # frame, and any frame whose caption or number of bars differs, is
+  # drawn in full; otherwise the cursor is moved to just the bars whose
+  # scaled length (or name) changed and only they are redrawn. Each frame
+  # is one write and one flush. A frame that comes less than 1 / fps
+  # seconds after the last one shown is not drawn but kept pending until
+  # the next frame is shown, replacing it, or flush() draws it; call
+  # flush() after the last update so that it reaches the screen
+  def __init__(self, scaleFactor=40, maxBars=None, file=None, fps=10):
+    super().__init__(scaleFactor, maxBars)
+    self.file = file if file is not None else sys.stdout
+    self.interval = 1 / fps if fps else 0
+    self.shown = None # The caption and (length, name) bars on screen
+    self.lastFrame = None
+    self.pending = False
+
+  def initialize(self, bars, maximum):
+    super().initialize(bars, maximum)
+    self.caption = None
+    self.bars = []
+
+  def draw_caption(self, caption):
+    self.caption = caption
+
+  def draw_bar(self, name, value):
+    self.bars.append((int(value * self.scale), name))
+
+  def draw_bars(self, names, values):
+    scale = self.scale
+    self.bars.extend([(int(value * scale), name)
+                      for name, value in zip(names, values)])
+
+  def finalize(self):
+    now = time.monotonic()
+    if (self.lastFrame is not None and
+        now - self.lastFrame < self.interval):
+      self.pending = True
+    else:
+      self._show(now)
+
+  def flush(self):
+    if self.pending:
+      self._show(time.monotonic())
+
+  def _show(self, now):
+    self.lastFrame = now
+    self.pending = False
+    parts = []
+    if (self.shown is None or self.shown[0] != self.caption or
+        len(self.shown[1]) != len(self.bars)):
+      if self.shown is not None: # Back to the top and clear the old one
+        parts.append("\x1b[{}F\x1b[J".format(len(self.shown[1]) + 2))
+      parts.append("{0:^{2}}\n{1:^{2}}\n".format(self.caption,
+                   "=" * len(self.caption), self.scaleFactor))
+      parts.extend("{} {}\n".format("*" * length, name)
+                   for length, name in self.bars)
+    else:
+      # The cursor starts and ends on the line below the chart
+      row = len(self.bars)
+      for i, (old, new) in enumerate(zip(self.shown[1], self.bars)):
+        if old != new:
+          parts.append("\x1b[{}F".format(row - i) if row > i else
+                       "\x1b[{}E".format(i - row))
+          parts.append("{} {}\x1b[K".format("*" * new[0], new[1]))
+          row = i
+      if parts:
+        parts.append("\x1b[{}E".format(len(self.bars) - row))
+    self.shown = (self.caption, self.bars)
+    if parts:
+      self.file.write("".join(parts))
+      self.file.flush()
+
+
 class ImageBarRenderer:
 
   COLORS = [Image.color_for_name(name) for name in ("red", "green",
             "blue", "yellow", "magenta", "cyan")]
 
-  def __init__(self, stepHeight=10, barWidth=30, barGap=2):
+  def __init__(self, stepHeight=10, barWidth=30, barGap=2, maxWidth=None,
+               maxHeight=None, extension=".xpm"):
+    # extension is any Image.FORMATS, e.g., ".png" for much smaller files
+    # written much faster than XPM's; maxWidth and maxHeight, if given,
+    # bound the image size by downsampling and scaling the bars
+    if extension not in Image.FORMATS:
+      raise ValueError("unsupported image extension {}".format(extension))
+    self.extension = extension
     self.stepHeight = stepHeight
     self.barWidth = barWidth
     self.barGap = barGap
+    self.maxWidth = maxWidth
+    self.maxHeight = maxHeight
+
+  @property
+  def maxBars(self):
+    if self.maxWidth is None:
+      return None
+    return max(1, self.maxWidth // (self.barWidth + self.barGap))
 
   def initialize(self, bars, maximum):
     assert bars > 0 and maximum > 0
     self.index = 0
-    color = Image.color_for_name("white")
-    self.image = Image.Image(bars * (self.barWidth + self.barGap),
-              maximum * self.stepHeight, background=color)
+    # Values are stepHeight pixels per unit unless that would make the
+    # image taller than maxHeight
+    self.scale = self.stepHeight
+    if self.maxHeight is not None and maximum * self.scale > self.maxHeight:
+      self.scale = self.maxHeight / maximum
+    self.background = Image.color_for_name("white")
+    self.image = self.make_image(bars * (self.barWidth + self.barGap),
+              max(1, int(maximum * self.scale)), self.background)
+
+  def make_image(self, width, height, background):
+    # Subclasses may override this, e.g., to draw into shared memory
+    return Image.Image(width, height, background=background)
 
   def draw_caption(self, caption):
-    self.filename = re.sub(r"\W+", "_", caption) + ".xpm"
+    self.filename = re.sub(r"\W+", "_", caption) + self.extension
 
   def draw_bar(self, name, value):
     color = ImageBarRenderer.COLORS[self.index % 
@@ -83,11 +320,31 @@ class ImageBarRenderer:
     width, height = self.image.size
     x0 = self.index * (self.barWidth + self.barGap)
     x1 = x0 + self.barWidth
-    y0 = height - (value * self.stepHeight)
+    y0 = height - int(value * self.scale)
     y1 = height - 1
     self.image.rectangle(x0, y0, x1, y1, fill=color)
     self.index += 1
 
+  def draw_bars(self, names, values):
+    if self.barGap < 1: # Adjacent bars overlap by a column
+      for name, value in zip(names, values):
+        self.draw_bar(name, value)
+      return
+    # As with draw_bar(), whose rectangle always includes the bottom row,
+    # every bar is at least one pixel high
+    bottom = self.image.height - 1
+    scale = self.scale
+    colors = ImageBarRenderer.COLORS
+    start = self.index
+    self.image.bars(start * (self.barWidth + self.barGap),
+                    [min(bottom + 1 - int(value * scale), bottom)
+                     for value in values],
+                    [colors[i % len(colors)] for i in
+                     range(start, start + len(values))],
+                    self.barWidth + 1, self.barWidth + self.barGap,
+                    self.background)
+    self.index += len(values)
+
   def finalize(self):
     self.image.save(self.filename)
     print("wrote", self.filename)
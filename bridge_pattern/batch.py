@@ -0,0 +1,84 @@
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import time
+
+
+# Helpers shared by the batch scripts, which read JSON lines items, each
+# with an optional name that becomes a file name, and process them in
+# chunks in a process pool.
+
+def read_json_lines(filenameOrFile):
+  file = None if isinstance(filenameOrFile, str) else filenameOrFile
+  try:
+    if file is None:
+      file = open(filenameOrFile, encoding="utf-8")
+    for line in file:
+      if line.strip():
+        yield json.loads(line)
+  finally:
+    if isinstance(filenameOrFile, str) and file:
+      file.close()
+
+def named_chunks(items, chunksize, prefix, numbered=False):
+  # Yields lists of up to chunksize items, or of (number, item) pairs if
+  # numbered; an item without a name is named prefix and its number, e.g.,
+  # chart000007, and one that is not a JSON object or whose name would
+  # lead out of the output directory is skipped
+  enumerated = enumerate(items)
+  while True:
+    numberedChunk = list(itertools.islice(enumerated, chunksize))
+    if not numberedChunk:
+      return
+    chunk = []
+    for i, item in numberedChunk:
+      if not isinstance(item, dict):
+        print("skipped {} {}: not an object".format(prefix, i),
+              file=sys.stderr)
+        continue
+      if "name" not in item:
+        item = dict(item, name="{}{:06d}".format(prefix, i))
+      elif not valid_name(item["name"]):
+        print("skipped {} {}: bad name {!r}".format(prefix, i, item["name"]),
+              file=sys.stderr)
+        continue
+      chunk.append((i, item) if numbered else item)
+    if chunk:
+      yield chunk
+
+def report_failure(prefix, number, name, error):
+  # For workers to report an item they could not process and carry on
+  print("failed {} {} {!r}: {}: {}".format(prefix, number, name,
+        type(error).__name__, error), file=sys.stderr)
+
+def valid_name(name):
+  return (isinstance(name, str) and name != "" and ".." not in name and
+          not any(separator in name for separator in ("/", os.sep, os.altsep)
+                  if separator))
+
+def completed(executor, function, chunks, maxPending, abandon=None):
+  # Submits function(chunk) for each chunk, with at most maxPending in
+  # flight however many chunks there are, and yields (future, submitted
+  # perf_counter() time) pairs as they complete. If the caller stops
+  # early, the chunks in flight are cancelled or waited for and abandon()
+  # is called with each result it will never see
+  pending = {}
+  try:
+    for chunk in chunks:
+      pending[executor.submit(function, chunk)] = time.perf_counter()
+      if len(pending) >= maxPending:
+        done, _ = concurrent.futures.wait(
+          pending, return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+          yield future, pending.pop(future)
+    for future in concurrent.futures.as_completed(list(pending)):
+      yield future, pending.pop(future)
+  finally:
+    for future in pending:
+      future.cancel()
+    for future in concurrent.futures.as_completed(list(pending)):
+      if (abandon is not None and not future.cancelled() and
+          future.exception() is None):
+        abandon(future.result())
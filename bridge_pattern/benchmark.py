@@ -0,0 +1,93 @@
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import Image
+
+
+# Times Image.rectangle() fills, reported as rectangles and megapixels
+# per second, and Image.save() in each format, on images of several
+# megapixels, both of random overlapping rectangles and of a bar chart.
+# Each timing is the best of --repeat runs. The pixels are held in numpy
+# arrays if numpy is installed unless --no-numpy is given.
+
+SIZES = ((1000, 1000), (2000, 1500), (4000, 3000))
+
+def main():
+  parser = argparse.ArgumentParser(description="benchmark the Image module")
+  parser.add_argument("-s", "--sizes", default=",".join(
+                      "{}x{}".format(*size) for size in SIZES))
+  parser.add_argument("-n", "--rectangles", type=int, default=2000)
+  parser.add_argument("-r", "--repeat", type=int, default=3)
+  parser.add_argument("-f", "--formats", default=",".join(Image.FORMATS))
+  parser.add_argument("--no-numpy", action="store_true")
+  args = parser.parse_args()
+  if args.no_numpy:
+    Image.numpy = None
+  print("pixels held in", "array('I')" if Image.numpy is None else "numpy")
+  sizes = [tuple(int(n) for n in size.split("x"))
+           for size in args.sizes.split(",")]
+  for width, height in sizes:
+    benchmark_image(width, height, args.rectangles, args.repeat,
+                    args.formats.split(","))
+
+def best_of(repeat, function):
+  best = float("inf")
+  for _ in range(repeat):
+    start = time.perf_counter()
+    function()
+    best = min(best, time.perf_counter() - start)
+  return best
+
+def make_rectangles(width, height, count, seed=0):
+  generator = random.Random(seed)
+  colors = [Image.color_for_name(name) for name in ("red", "green", "blue",
+            "yellow", "magenta", "cyan")]
+  rectangles = []
+  for i in range(count):
+    x0 = generator.randrange(width)
+    y0 = generator.randrange(height)
+    x1 = min(x0 + generator.randrange(1, width // 4 + 2), width - 1)
+    y1 = min(y0 + generator.randrange(1, height // 4 + 2), height - 1)
+    rectangles.append((x0, y0, x1, y1, colors[i % len(colors)]))
+  return rectangles
+
+def benchmark_image(width, height, count, repeat, formats):
+  rectangles = make_rectangles(width, height, count)
+  pixels = sum((x1 - x0 + 1) * (y1 - y0 + 1)
+               for x0, y0, x1, y1, _ in rectangles)
+  image = Image.Image(width, height,
+                      background=Image.color_for_name("white"))
+  def fill():
+    for x0, y0, x1, y1, color in rectangles:
+      image.rectangle(x0, y0, x1, y1, fill=color)
+  filled = best_of(repeat, fill)
+  megapixels = width * height / 1e6
+  print("{}x{} ({:.1f} MP): fill {:.3f}s ({:,.0f} rectangles/s, {:,.0f} "
+        "MP/s)".format(width, height, megapixels, filled, count / filled,
+        pixels / filled / 1e6))
+  benchmark_save(image, "rectangles", repeat, formats)
+  chart = Image.Image(width, height,
+                      background=Image.color_for_name("white"))
+  generator = random.Random(0)
+  chart.bars(0, [generator.randrange(height) for _ in range(width // 8)],
+             [Image.color_for_name("blue")] * (width // 8), 7, 8,
+             Image.color_for_name("white"))
+  benchmark_save(chart, "chart", repeat, formats)
+
+def benchmark_save(image, name, repeat, formats):
+  megapixels = image.width * image.height / 1e6
+  print(" ", name)
+  with tempfile.TemporaryDirectory() as directory:
+    for extension in formats:
+      for threaded in (False, True) if extension == ".png" else (False,):
+        filename = os.path.join(directory, "image" + extension)
+        saved = best_of(repeat, lambda: image.save(filename, threaded))
+        print("    save {}{:9} {:.3f}s ({:5.1f} MP/s, {:,} bytes)".format(
+              extension, " threaded" if threaded else "", saved,
+              megapixels / saved, os.path.getsize(filename)))
+
+if __name__ == '__main__':
+  main()
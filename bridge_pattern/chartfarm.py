@@ -0,0 +1,203 @@
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import os
+import sys
+import threading
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import barchart
+import batch
+import Image
+import pipeline
+
+
+# Each chart spec is a dict such as
+#   {"name": "week23", "caption": "Forecast 6/8",
+#    "pairs": [["Mon", 16], ["Tue", 17], ["Wed", 19]], "maximum": 25}
+# where the name and maximum are optional; specs whose names hold a path
+# separator or ".." are skipped. Worker processes rasterize the charts
+# with BarCharter and ImageBarRenderer into shared memory and send back
+# only each segment's name and the image size; the parent's I/O stage, a
+# pipeline.thread_sink(), encodes and writes each image and frees its
+# segment. A chart that cannot be rendered or saved, e.g., for lack of
+# pairs, is reported and counted as failed while the rest are rendered.
+
+def main():
+  parser = argparse.ArgumentParser(
+    description="render JSON lines bar chart specs as image files")
+  parser.add_argument("specs", help="JSON lines file, - for stdin")
+  parser.add_argument("directory", help="output directory")
+  parser.add_argument("-e", "--extension", choices=Image.FORMATS,
+                      default=".png")
+  parser.add_argument("-j", "--workers", type=int, default=None)
+  parser.add_argument("-c", "--chunksize", type=int, default=8)
+  parser.add_argument("-t", "--io-threads", type=int, default=4,
+                      help="threads encoding and writing images")
+  args = parser.parse_args()
+  if args.specs == "-":
+    specs = batch.read_json_lines(sys.stdin)
+  else:
+    specs = batch.read_json_lines(args.specs)
+  stats = render_batch(specs, args.directory, args.extension, args.workers,
+                       args.chunksize, args.io_threads)
+  report(stats)
+
+class SharedImageBarRenderer(barchart.ImageBarRenderer):
+
+  # Draws into a new shared memory segment instead of saving a file; the
+  # segment outlives this process and must be unlinked by whoever saves
+  # it, so it is unregistered from this process's resource tracker, which
+  # would otherwise unlink it (and warn) when the worker exits
+  def make_image(self, width, height, background):
+    self.memory = shared_memory.SharedMemory(create=True,
+                                             size=width * height * 4)
+    resource_tracker.unregister(self.memory._name, "shared_memory")
+    return Image.Image(width, height, background, buffer=self.memory.buf)
+
+  def draw_caption(self, caption):
+    pass
+
+  def finalize(self):
+    width, height = self.image.size
+    self.image = None # Releases the buffer so the segment can be closed
+    self.memory.close()
+    self.result = (self.memory.name, width, height)
+
+  def discard(self):
+    memory = getattr(self, "memory", None)
+    if memory is not None:
+      self.image = None
+      memory.close()
+      unlink_segment(memory.name)
+
+def render_chunk(chunk):
+  # Runs in a worker process; returns (number, name, segment name, width,
+  # height, seconds) for each chart, the segment name being None for one
+  # that failed. If the chunk itself is interrupted, no segment of it is
+  # returned so none may be left behind
+  results = []
+  for number, spec in chunk:
+    start = time.perf_counter()
+    renderer = SharedImageBarRenderer()
+    try:
+      barchart.BarCharter(renderer).render(spec["caption"], spec["pairs"],
+                                           spec.get("maximum"))
+    except Exception as err:
+      renderer.discard()
+      batch.report_failure("chart", number, spec["name"], err)
+      results.append((number, spec["name"], None, 0, 0,
+                      time.perf_counter() - start))
+      continue
+    except BaseException:
+      renderer.discard()
+      for result in results:
+        if result[2] is not None:
+          unlink_segment(result[2])
+      raise
+    results.append((number, spec["name"]) + renderer.result +
+                   (time.perf_counter() - start,))
+  return results
+
+def unlink_segment(memoryName):
+  try:
+    memory = shared_memory.SharedMemory(memoryName)
+  except FileNotFoundError:
+    return
+  memory.close()
+  memory.unlink()
+
+def save_chart(memoryName, width, height, filename):
+  memory = shared_memory.SharedMemory(memoryName)
+  image = None
+  try:
+    image = Image.Image(width, height, None, buffer=memory.buf)
+    image.save(filename)
+  finally:
+    image = None # Releases the buffer so the segment can be closed
+    memory.unlink()
+    try:
+      memory.close()
+    except BufferError: # A failed save's traceback still holds the buffer
+      pass
+  return os.path.getsize(filename)
+
+Stats = collections.namedtuple("Stats",
+                               "count bytes render latencies elapsed failures")
+
+def render_batch(specs, directory, extension=".png", workers=None,
+                 chunksize=8, ioThreads=4):
+  # Each chart's latency runs from its chunk's submission to its file's
+  # write
+  os.makedirs(directory, exist_ok=True)
+  workers = workers or os.cpu_count() or 1
+  totals = dict(count=0, bytes=0, render=0.0, failures=0)
+  latencies = []
+  lock = threading.Lock()
+  unsaved = set() # Segments not yet unlinked
+  def save(item):
+    submitted, number, name, memoryName, width, height, seconds = item
+    try:
+      size = save_chart(memoryName, width, height,
+                        os.path.join(directory, name + extension))
+    except Exception as err:
+      batch.report_failure("chart", number, name, err)
+      with lock:
+        unsaved.discard(memoryName)
+        totals["failures"] += 1
+      return
+    with lock:
+      unsaved.discard(memoryName)
+      totals["count"] += 1
+      totals["bytes"] += size
+      totals["render"] += seconds
+      latencies.append(time.perf_counter() - submitted)
+  def track(results):
+    with lock:
+      unsaved.update(result[2] for result in results
+                     if result[2] is not None)
+  start = time.perf_counter()
+  writer = pipeline.thread_sink(save, ioThreads)
+  try:
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+      # If anything fails the segments of the chunks still in flight are
+      # tracked too, so that they are unlinked below
+      with contextlib.closing(batch.completed(executor, render_chunk,
+          batch.named_chunks(specs, chunksize, "chart", numbered=True),
+          workers * 2, abandon=track)) as completed:
+        for future, submitted in completed:
+          results = future.result()
+          track(results)
+          for result in results:
+            if result[2] is None:
+              with lock:
+                totals["failures"] += 1
+            else:
+              writer.send((submitted,) + result)
+  finally:
+    writer.close() # Waits for the queued images to be written
+    for memoryName in list(unsaved):
+      unlink_segment(memoryName)
+  elapsed = time.perf_counter() - start
+  return Stats(totals["count"], totals["bytes"], totals["render"],
+               sorted(latencies), elapsed, totals["failures"])
+
+def report(stats):
+  count, size, render, latencies, elapsed, failures = stats
+  elapsed = elapsed or 1e-9
+  print("{:,} charts, {:,} bytes in {:.2f}s ({:,.0f} charts/s, {:.1f} "
+        "MB/s, {:.2f}ms rendering each){}".format(count, size, elapsed,
+        count / elapsed, size / elapsed / 1e6, 1000 * render / max(count, 1),
+        ", {:,} failed".format(failures) if failures else ""))
+  if latencies:
+    def percentile(p):
+      return 1000 * latencies[min(len(latencies) - 1,
+                                  int(p * len(latencies)))]
+    print("latency: median {:.1f}ms, 95th percentile {:.1f}ms, max "
+          "{:.1f}ms".format(percentile(0.5), percentile(0.95),
+          1000 * latencies[-1]))
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,87 @@
+import collections
+import concurrent.futures
+import Qtrac
+
+
+# Push-style pipeline stages built on Qtrac.coroutine. Every stage except
+# source() is a primed generator that is sent items one at a time and
+# sends its results on to its target stage, e.g.,
+#
+#   source(read_paragraphs(filename),
+#          filterer(str.strip, mapper(str.upper, page.sink())))
+#
+# Closing a stage closes every stage after it, so when source() runs out
+# any partial batch is flushed and every sink finishes.
+
+def source(iterable, target):
+  try:
+    for item in iterable:
+      target.send(item)
+  finally:
+    target.close()
+
+@Qtrac.coroutine
+def mapper(function, target):
+  try:
+    while True:
+      target.send(function((yield)))
+  except GeneratorExit:
+    target.close()
+
+@Qtrac.coroutine
+def filterer(predicate, target):
+  try:
+    while True:
+      item = (yield)
+      if predicate(item):
+        target.send(item)
+  except GeneratorExit:
+    target.close()
+
+@Qtrac.coroutine
+def batcher(size, target):
+  # Sends lists of up to size items
+  batch = []
+  try:
+    while True:
+      batch.append((yield))
+      if len(batch) >= size:
+        target.send(batch)
+        batch = []
+  except GeneratorExit:
+    if batch:
+      target.send(batch)
+    target.close()
+
+@Qtrac.coroutine
+def sink(function, finish=None):
+  try:
+    while True:
+      function((yield))
+  except GeneratorExit:
+    if finish is not None:
+      finish()
+
+@Qtrac.coroutine
+def thread_sink(function, workers=4, maxPending=None, finish=None):
+  # Hands each item to a thread pool, for I/O-bound sinks; at most
+  # maxPending items are queued and when it is closed it waits for all of
+  # them, re-raising the first exception any of them raised
+  maxPending = maxPending or workers * 2
+  pending = collections.deque()
+  with concurrent.futures.ThreadPoolExecutor(workers) as executor:
+    try:
+      while True:
+        item = (yield)
+        if len(pending) >= maxPending:
+          done, _ = concurrent.futures.wait(
+            pending, return_when=concurrent.futures.FIRST_COMPLETED)
+          for future in done:
+            pending.remove(future)
+            future.result()
+        pending.append(executor.submit(function, item))
+    except GeneratorExit:
+      for future in concurrent.futures.as_completed(pending):
+        future.result()
+      if finish is not None:
+        finish()